@@ -1,11 +1,20 @@
 from __future__ import annotations
-import json, os, sys, uuid, time, re, traceback
+import json, os, sys, uuid, time, re, io, hashlib, bisect, binascii, threading
 from typing import Dict, Any, List, Optional, Tuple
+from functools import lru_cache
+from operator import itemgetter
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from pathlib import Path
-from datetime import datetime
 
 from PySide6 import QtCore, QtGui, QtWidgets
 
+try:
+    import orjson  # 任意：入っていれば notes.json などの読み書きを C 実装で行う（無ければ標準の json）
+except ImportError:
+    orjson = None
+
 APP_TITLE = "めもめも"
 
 # 保存先（Winなら %LOCALAPPDATA%\BenriNote）
@@ -13,32 +22,210 @@ DATA_DIR = Path(os.getenv("LOCALAPPDATA", str(Path.home()))) / "BenriNote"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 DATA_FILE = DATA_DIR / "notes.json"
 CONF_FILE = DATA_DIR / "window.json"
+MEMO2_FILE = DATA_DIR / "memo2.html"  # フリースペース本文（画像込みで大きくなるので notes.json とは別に保存）
+ARCHIVE_FILE = DATA_DIR / "archive.ndjson"  # アーカイブ（増える一方なので notes.json とは別に、1件ごとに追記する）
+IMAGE_DIR = DATA_DIR / "images"  # 埋め込み画像の実体（本文には src="benri-img:<内容ハッシュ>.png" だけを書く）
+IMG_SCHEME = "benri-img"
 LOG_FILE = DATA_DIR / "error.log"
+CURRENT_SCHEMA = 2  # notes.json のデータ構造の版（これ未満なら起動時に移行処理を行う）
+MAX_IMAGE_WIDTH = 1600  # 埋め込む画像の最大幅（これより大きい画像は縮小してから埋め込む）
 
 # ===== Theme =====
 ACCENT, ACCENT_HOVER, ACCENT_WEAK = "#4F8AF3", "#6BA0F6", "#E6E6FF"
 FG, BG, PANEL_BG = "#222222", "#FAFAFB", "#FFFFFF"
 BORDER, HANDLE = "#E6E6EA", "#EAEAEA"
+# 描画で使う色は "#rrggbb" の解析を繰り返さないよう QColor にしておく（QColor は値型なので共有しても書き換わらない）
+_QC_FG, _QC_PANEL_BG, _QC_BORDER = QtGui.QColor(FG), QtGui.QColor(PANEL_BG), QtGui.QColor(BORDER)
+
+# エディタ個別のスタイルシートは背景色だけにする（余白・枠線は全体のスタイルシートの
+# QTextEdit#editorDetail/#editorFree がそのまま効くので、色を変えるたびに解析するのは1つの宣言だけで済む）
+_EDITOR_QSS_TMPL = "QTextEdit{{background:{bg};}}"
+
+# ウィンドウ全体のスタイルシート（色はすべて定数なので、起動時に1回だけ組み立てる）
+_GLOBAL_QSS = f"""
+    QWidget {{ background: {BG}; color: {FG}; }}
+    QLineEdit, QListView, QTabWidget::pane, QMenu {{
+        background: {PANEL_BG}; border: 1px solid {BORDER}; border-radius: 8px;
+    }}
+    QListView::item:selected {{ background: {ACCENT_WEAK}; color: {FG}; }}
+    QLineEdit {{ padding:6px 8px; }}
+    QPushButton {{
+        background: {PANEL_BG}; border:1px solid {BORDER}; border-radius:8px; padding:6px 10px;
+    }}
+    QPushButton:hover {{ border-color: {ACCENT_HOVER}; }}
+    QPushButton:pressed {{ background: #f2f6ff; border-color:{ACCENT}; }}
+    QTabBar::tab {{
+        background: {PANEL_BG}; border:1px solid {BORDER}; border-bottom: none; padding:6px 12px; margin-right:2px;
+        border-top-left-radius:8px; border-top-right-radius:8px;
+    }}
+    QTabBar::tab:selected {{ background: {ACCENT_WEAK}; border-color:{ACCENT}; }}
+    QTabWidget::pane {{ border-top: 1px solid {ACCENT}; border-radius:8px; }}
+    QScrollBar:vertical {{ background: transparent; width: 10px; margin: 2px 0; }}
+    QScrollBar::handle:vertical {{ background: {BORDER}; border-radius: 6px; }}
+    QScrollBar::handle:vertical:hover {{ background: {ACCENT_HOVER}; }}
+    QScrollBar:horizontal {{ background: transparent; height: 10px; margin: 0 2px; }}
+    QScrollBar::handle:horizontal {{ background: {BORDER}; border-radius: 6px; }}
+    QToolBar#topBar {{ padding:6px; border:0; background: {BG}; }}
+    QToolBar#topBar QToolButton {{ padding:6px 12px; border:1px solid {BORDER}; border-radius:8px; background:{PANEL_BG}; }}
+    QToolBar#topBar QToolButton:checked {{ background:{ACCENT_WEAK}; border-color:{ACCENT}; color:{FG}; }}
+    QToolBar#topBar QToolButton:hover {{ border-color:{ACCENT_HOVER}; }}
+    QToolBar#richBar {{ border:0; background: transparent; }}
+    QLabel#sectionLabel {{ font-weight:bold; color:{FG}; }}
+    QTextEdit#editorDetail, QTextEdit#editorFree {{
+        background:{PANEL_BG}; padding:6px; border:1px solid {BORDER}; border-radius:8px;
+    }}
+    QSplitter#rightSplitter::handle {{
+        background: {HANDLE}; border-left: 1px solid {BORDER}; border-right: 1px solid {BORDER}; margin: 6px 0;
+    }}
+    QSplitter#leftSplit::handle {{ background:{HANDLE}; border:1px solid {BORDER}; }}
+    QSplitter#mainSplitter::handle {{
+        background: {HANDLE}; border-left: 1px solid {BORDER}; border-right: 1px solid {BORDER};
+    }}
+"""
+
+@lru_cache(maxsize=None)
+def editor_qss(bg: str) -> str:
+    """エディタ用スタイルシート（背景色ごとに1度だけ組み立てる）"""
+    return _EDITOR_QSS_TMPL.format(bg=bg)
 
 # ---------- JSON ----------
 def load_json(path: Path, default: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            raw = f.read()
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
     except Exception:
-        # エラー発生時はデフォルト値を返す（ディープコピーの代わり）
-        return json.loads(json.dumps(default))
-
-def save_json(path: Path, data: Dict[str, Any]):
-    tmp = path.with_suffix(".tmp")
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    # アトミックな置換
-    tmp.replace(path)
+        # エラー発生時はデフォルト値のコピーを返す（JSON の書き出し・読み直しを挟まない）
+        return clone_json(default)
+    remember_bytes(path, raw)
+    return data
+
+def clone_json(obj: Any) -> Any:
+    """dict/list と不変の値だけでできた構造を複製する（copy.deepcopy のような型ごとの分岐や循環参照用のメモを持たない）
+    文字列などの不変値は複製せずに共有する"""
+    t = type(obj)
+    if t is dict: return {k: clone_json(v) for k, v in obj.items()}
+    if t is list: return [clone_json(v) for v in obj]
+    return obj
+
+_LAST_HASH: Dict[Path, bytes] = {}  # ファイルごとの、最後に書き込んだ（または読み込んだ）内容のハッシュ
+_UNSYNCED: set = set()              # 自動保存（durable=False）で書いたまま、まだディスクへ同期していないファイル
+
+def _content_hash(blob: bytes) -> bytes:
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+def remember_bytes(path: Path, blob: bytes):
+    """読み込んだ内容をディスク上の内容として覚える（変更せずに保存しても書き込まない）"""
+    _LAST_HASH[path] = _content_hash(blob)
+
+def dump_json_bytes(data: Dict[str, Any]) -> bytes:
+    """UTF-8・インデント2の JSON。orjson なら文字列を経由せずに直接バイト列を作る"""
+    if orjson is not None: return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+def save_json(path: Path, data: Dict[str, Any], durable: bool = False, force: bool = False):
+    save_bytes(path, dump_json_bytes(data), durable, force)
+
+def save_bytes(path: Path, blob: bytes, durable: bool = False, force: bool = False):
+    """内容が前回書き込み時と同じなら書き直さない（force=True なら必ず書く）
+    ただし durable=True で、その内容を自動保存で書いたまま同期していなければ、既存のファイルを fsync する"""
+    h = _content_hash(blob)
+    if not force and _LAST_HASH.get(path) == h:
+        if durable and path in _UNSYNCED: fsync_file(path); _UNSYNCED.discard(path)
+        return
+    write_bytes_atomic(path, blob, durable)
+    _LAST_HASH[path] = h
+    if durable: _UNSYNCED.discard(path)
+    else: _UNSYNCED.add(path)
+
+def fsync_file(path: Path):
+    """書き込み済みのファイルをディスクへ同期する（Windows の fsync は書き込み可能なハンドルが要る）"""
+    fd = os.open(path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+    try: os.fsync(fd)
+    finally: os.close(fd)
+
+def write_bytes_atomic(path: Path, blob: bytes, durable: bool = False):
+    """一時ファイルに1回で書き込み、os.replace でアトミックに置換する
+    ディスクへの同期は durable=True のときだけ行う（中身に加えて、POSIX では置換後のディレクトリも同期して改名を確定させる）
+    自動保存（durable=False）は置換の原子性だけで足りるので、毎回同期を待たない"""
+    tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp") # 別スレッドが同じファイルを書いても一時ファイルは別
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        try:
+            mv = memoryview(blob)
+            while mv: mv = mv[os.write(fd, mv):]
+            if durable: os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.unlink(tmp)
+        except OSError: pass
+        raise
+    if durable and os.name == "posix": # Windows はディレクトリを開けないので、置換の確定は OS に任せる
+        dfd = os.open(path.parent, os.O_RDONLY)
+        try: os.fsync(dfd)
+        finally: os.close(dfd)
+
+# ---------- アーカイブの追記ログ（JSON Lines） ----------
+# 1行が1操作：{"op": "add"|"put", "list": 格納先, "item": {...}} / {"op": "del", "list": 格納先, "id": ...}
+# 格納先はカテゴリ名（ToDo のアーカイブは null）。起動時に先頭から再生し、終了時に "add" だけの形に詰め直す
+def _archive_rec(op: str, lst: Optional[str], item: Dict[str, Any]) -> Dict[str, Any]:
+    return {"op": op, "list": lst, "id": item["id"]} if op == "del" else {"op": op, "list": lst, "item": item}
+
+def archive_record(op: str, lst: Optional[str], item: Dict[str, Any]) -> str:
+    if orjson is not None: return orjson.dumps(_archive_rec(op, lst, item)).decode("utf-8") + "\n"
+    return json.dumps(_archive_rec(op, lst, item), ensure_ascii=False) + "\n"
+
+def archive_compact(lists: Dict[Optional[str], List[Dict[str, Any]]]) -> bytes:
+    """全項目を add 行として書き出す。orjson ならバイト列のまま連結する（行ごとの文字列化と最後のエンコードを省く）"""
+    if orjson is not None:
+        return b"".join(orjson.dumps(_archive_rec("add", lst, it)) + b"\n" for lst, items in lists.items() for it in items)
+    return "".join(archive_record("add", lst, it) for lst, items in lists.items() for it in items).encode("utf-8")
+
+def split_archive_log(entries: List[Tuple[str, Tuple[Optional[str], str], str]]) -> Tuple[str, str]:
+    """積んであるログ (op, (格納先, id), 行) を「notes.json より先に書く分」と「後に書く分」に分ける
+    後者は、そのあとで同じ項目に触れない del だけ（末尾へ移しても再生結果は変わらない）。
+    notes.json に戻した項目をアーカイブから消すのはそこに書けてからにするので、途中で落ちても両方に残るだけになる"""
+    later = set(); pre: List[str] = []; post: List[str] = []
+    for op, key, line in reversed(entries):
+        if op == "del" and key not in later: post.append(line)
+        else: pre.append(line)
+        later.add(key)
+    return "".join(reversed(pre)), "".join(reversed(post))
+
+def load_archive_log(path: Path) -> Optional[Tuple[Dict[Optional[str], List[Dict[str, Any]]], bool]]:
+    """ログを再生して (格納先ごとの項目リスト, 全行を読めたか) を返す（ファイルが無ければ None）
+    書きかけで切れた行は読み飛ばす。その後ろに追記すると次の行も壊れるので、呼び出し側で詰め直す"""
+    try:
+        f = open(path, "rb")  # 行はバイト列のまま JSON パーサーに渡す（UTF-8 として解釈される）
+    except FileNotFoundError:
+        return None
+    lists: Dict[Optional[str], Dict[str, Dict[str, Any]]] = {}
+    intact = True
+    with f:
+        for line in f:
+            try:
+                rec = orjson.loads(line) if orjson is not None else json.loads(line)
+                op, lst = rec["op"], rec["list"]
+                key = rec["id"] if op == "del" else rec["item"]["id"]
+            except (ValueError, KeyError, TypeError): intact = False; continue # JSON として読めても形が違う行も同じ扱い
+            items = lists.setdefault(lst, {})
+            if op == "del": items.pop(key, None)
+            else: items[key] = rec["item"] # put は同じ id の項目をその位置のまま置き換える
+    return {lst: list(items.values()) for lst, items in lists.items()}, intact
+
+def append_text(path: Path, text: str):
+    """末尾に追記して fsync する（既存の内容は書き直さない）"""
+    with open(path, "ab") as f:
+        f.write(text.encode("utf-8")); f.flush(); os.fsync(f.fileno())
 
 # ---------- 例外ハンドラ ----------
 def install_excepthook():
     def _hook(t, v, tb):
+        # エラー時にしか使わないので、起動時ではなくここで読み込む
+        import traceback
+        from datetime import datetime
         try:
             LOG_FILE.write_text(
                 f"[{datetime.now()}]\n" + "".join(traceback.format_exception(t, v, tb)),
@@ -53,66 +240,181 @@ def install_excepthook():
             pass
     sys.excepthook = _hook
 
-# =========================================================
-# ユーティリティ
-# =========================================================
-def plain_to_html(text: str) -> str:
-    import html
-    if text is None: text = ""
-    # <p>タグで囲み、改行を<br>に
-    return f"<p>{html.escape(text).replace('\n', '<br>')}</p>"
-
-def html_to_plain(html: str) -> str:
-    if not html: return ""
-    # スタイルやヘッドを削除
-    html = re.sub(r"<style\b[^>]*>.*?</style>", "", html, flags=re.I | re.S)
-    html = re.sub(r"<head\b[^>]*>.*?</head>", "", html, flags=re.I | re.S)
-    # <br>を改行に変換
-    html = re.sub(r"<br\s*/?>", "\n", html, flags=re.I)
-    # その他すべてのタグを削除
-    html = re.sub(r"<[^>]+>", "", html)
-    # QTextDocumentFragmentでエンティティなどをデコードしてプレーンテキスト取得
-    txt = QtGui.QTextDocumentFragment.fromHtml(html).toPlainText()
-    return txt.strip()
-
 # =========================================================
 # 画像埋め込み / 区切り線 / リンク対応テキストエディタ
 # =========================================================
-def _qimage_to_data_url(img: QtGui.QImage, fmt: str = "PNG") -> str:
-    buf = QtCore.QBuffer()
+_IMG_NAME_RE = re.compile(r"^[0-9a-f]{32}\.(?:png|jpg)$")            # images フォルダのファイル名
+_IMG_REF_RE = re.compile(rb"benri-img:([0-9a-f]{32}\.(?:png|jpg))")   # 保存ファイル中の参照
+_IMG_SRC_SCHEME_RE = re.compile(r"benri-img:([0-9a-f]{32}\.(?:png|jpg))")  # コピーする HTML 中の参照
+
+def _encode_qimage(img: QtGui.QImage, fmt: str = "PNG") -> bytes:
+    raw = QtCore.QByteArray(); buf = QtCore.QBuffer(raw)
     buf.open(QtCore.QIODevice.WriteOnly)
-    img.save(buf, fmt)
-    ba = buf.data().toBase64().data().decode("ascii")
+    img.save(buf, fmt); buf.close()
+    return raw.data()
+
+def _bytes_to_data_url(blob: bytes, fmt: str = "PNG") -> str:
+    # base64 化は Python 側（binascii の C 実装）で1回だけ行う（Qt の base64 用バッファを別に作らない）
+    ba = binascii.b2a_base64(blob, newline=False).decode("ascii")
     mime = "image/png" if fmt.upper() == "PNG" else f"image/{fmt.lower()}"
     return f"data:{mime};base64,{ba}"
 
-def _qimage_to_html_tag(img: QtGui.QImage) -> str:
-    return f'<img src="{_qimage_to_data_url(img)}" alt="image" />'
+def _qimage_to_src(img: QtGui.QImage, fmt: str = "PNG") -> str:
+    """画像を images フォルダに保存し、本文に書く src（benri-img:<内容ハッシュ>.png）を返す。ワーカースレッドからも呼ばれる
+    notes.json に base64 を持たないので、保存のたびに画像のバイト列まで書き直さずに済む（保存できなければ data URL にする）"""
+    blob = _encode_qimage(img, fmt)
+    name = hashlib.blake2b(blob, digest_size=16).hexdigest() + (".jpg" if fmt.upper() == "JPEG" else ".png")
+    path = IMAGE_DIR / name
+    try:
+        if not path.exists(): # 同じ画像は1つのファイルを共有する
+            IMAGE_DIR.mkdir(exist_ok=True); write_bytes_atomic(path, blob, durable=True) # 本文より先に確実に残す
+        else: os.utime(path) # 使い直した画像も、次の保存までは gc_stored_images に消されないようにする
+    except OSError:
+        return _bytes_to_data_url(blob, fmt)
+    return f"{IMG_SCHEME}:{name}"
+
+def gc_stored_images(*sources: Path):
+    """どの保存ファイルからも参照されていない images フォルダの画像を消す
+    起動直後（編集が始まる前）に1回だけ呼ぶ。読めないファイルがあれば何も消さない。
+    最後の保存より新しい画像は、別に起動しているウィンドウがまだ保存していない本文の分かもしれないので残す"""
+    try: names = [n for n in os.listdir(IMAGE_DIR) if _IMG_NAME_RE.match(n)]
+    except FileNotFoundError: return
+    if not names: return
+    used = set(); saved_at = 0
+    for src in sources:
+        try:
+            with open(src, "rb") as f:
+                saved_at = max(saved_at, os.fstat(f.fileno()).st_mtime_ns); used.update(_IMG_REF_RE.findall(f.read()))
+        except FileNotFoundError: continue
+        except OSError: return
+    for n in names:
+        if n.encode("ascii") in used: continue
+        path = IMAGE_DIR / n
+        try:
+            if path.stat().st_mtime_ns < saved_at: path.unlink()
+        except OSError: pass
+
+@lru_cache(maxsize=16)
+def _load_qimage(path: str, mtime_ns: int) -> QtGui.QImage:
+    """同じファイル（更新時刻も同じ）の画像は再デコードせずに使い回す（QImageは暗黙共有なので安全）
+    大きな画像はデコード時点で MAX_IMAGE_WIDTH に縮小し、フル解像度のピクセルを展開しない"""
+    reader = QtGui.QImageReader(path); reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid() and size.width() > MAX_IMAGE_WIDTH:
+        reader.setScaledSize(QtCore.QSize(MAX_IMAGE_WIDTH, max(1, size.height() * MAX_IMAGE_WIDTH // size.width())))
+    return reader.read()
+
+def _fit_image_width(img: QtGui.QImage) -> QtGui.QImage:
+    """貼り付け画像など、既にデコード済みの画像を MAX_IMAGE_WIDTH に収める"""
+    if img.width() > MAX_IMAGE_WIDTH: return img.scaledToWidth(MAX_IMAGE_WIDTH, QtCore.Qt.SmoothTransformation)
+    return img
+
+def _qimage_to_html_tag(img: QtGui.QImage, fmt: str = "PNG") -> str:
+    return f'<img src="{_qimage_to_src(img, fmt)}" alt="image" />'
+
+def _embed_format(path: str) -> str:
+    """ファイルから埋め込むときの形式。JPEG の写真を PNG にすると何倍にも膨らむので、JPEG は JPEG のまま埋め込む"""
+    return "JPEG" if path.lower().endswith((".jpg", ".jpeg")) else "PNG"
+
+# 挿入可能な画像拡張子（Qtのプラグインで読める形式を起動時に1回だけ調べる）
+_IMG_EXTS = frozenset(bytes(f).decode().lower() for f in QtGui.QImageReader.supportedImageFormats()) | \
+            frozenset(("png", "jpg", "jpeg", "bmp", "gif", "webp"))
+
+_IMG_TAG_RE = re.compile(r'<img([^>]*?)\bsrc=["\']([^"\']+)["\']([^>]*)>', re.I)
+_IMG_SRC_RE = re.compile(r'<img[^>]*\bsrc=["\']([^"\']+)["\'][^>]*>', re.I)  # 貼り付け時：タグ全体を置き換える用
+_SRC_ATTR_RE = re.compile(r"""\bsrc=["']""", re.I)  # 候補位置の手前が src=" かどうかの確認用（その位置でだけ照合する）
+_INLINE_SKIP_PREFIXES = ("data:", "http:", "https:")
+_DRIVE_RE = re.compile(r"^[a-zA-Z]:")           # ドライブレター付きのパス（file:///C:/... の中身など）
+_WINPATH_RE = re.compile(r"^[a-zA-Z]:[\\/]")    # C:\... / C:/... 形式のWindowsパス
+_img_pool: Optional[ThreadPoolExecutor] = None
+
+@lru_cache(maxsize=16)
+def _file_to_img_src(path: str, mtime_ns: int) -> Optional[str]:
+    """画像ファイル → 埋め込み用の src（読めなければ None）。ワーカースレッドからも呼ばれる"""
+    qimg = _load_qimage(path, mtime_ns)
+    return None if qimg.isNull() else _qimage_to_src(qimg, _embed_format(path))
+
+def _file_url_to_path(src: str) -> str:
+    """file:/// URL → ローカルパス。QUrl を作らずに文字列処理で済ませ、見つからない時だけ QUrl で解釈し直す"""
+    path = unquote(src[8:]) # file:///C:/... → C:/...
+    if not _DRIVE_RE.match(path): path = "/" + path # file:///home/... → /home/...
+    path = os.path.normpath(path)
+    if not os.path.exists(path): path = QtCore.QUrl(src).toLocalFile()
+    return path
+
+def _external_image_path(src: str) -> Optional[str]:
+    """imgのsrcがローカルファイルを指していればそのパスを返す（data: や http(s) は None）"""
+    low = src[:8].lower()
+    if low.startswith(_INLINE_SKIP_PREFIXES): return None # 既にインライン化済み / Web上の画像はスキップ
+    path = None
+    if low == "file:///":
+        path = _file_url_to_path(src)
+    elif _WINPATH_RE.match(src): # Windowsパス
+        path = src
+    return path if path and os.path.exists(path) else None
+
+def _external_img_tags(html: str) -> List[re.Match]:
+    """src が file:/// や C:\\ 形式の img タグを、前から順に返す
+    re.I の正規表現で文書全体（数MBの data URL を含む）を走査すると遅いので、外部パスに必ず含まれる
+    ":/" と ":\\" を str.find で探し（base64 には ":" が現れない）、見つかった位置のタグだけを正規表現で確かめる"""
+    found: Dict[int, re.Match] = {}
+    for sep in (":/", ":\\"):
+        k = html.find(sep)
+        while k >= 0:
+            # src の先頭の候補（file:/// の "f" / C:\ の "C"）。http:// などはここで落とす
+            p = k - 4 if html[k - 4:k].lower() == "file" else k - 1 if html[k - 1:k].isascii() and html[k - 1:k].isalpha() else -1
+            if p >= 5 and html[p - 1] in "\"'" and _SRC_ATTR_RE.match(html, p - 5):
+                start = html.rfind("<", 0, p)
+                m = _IMG_TAG_RE.match(html, start) if start >= 0 else None
+                if m and m.start(2) == p: found[start] = m
+            k = html.find(sep, k + 2)
+    return [found[k] for k in sorted(found)]
 
 def inline_external_images(html: str) -> str:
-    if not html: return html
-    def replace_tag(m: re.Match) -> str:
-        whole, before, src, after = m.group(0), m.group(1), m.group(2), m.group(3)
-        if src.lower().startswith("data:"): return whole # 既にインライン化されている場合はスキップ
-        path = None
-        if src.lower().startswith("file:///"):
-            path = QtCore.QUrl(src).toLocalFile()
-        elif re.match(r"^[a-zA-Z]:[\\/]", src): # Windowsパス
-            path = src
-        if path and os.path.exists(path):
-            qimg = QtGui.QImage(path)
-            if not qimg.isNull():
-                return f"<img{before}src=\"{_qimage_to_data_url(qimg,'PNG')}\"{after}>"
-        return whole
-    # imgタグのsrc属性を検索し、外部URLならインライン化
-    return re.sub(r'<img([^>]*?)\bsrc=["\']([^"\']+)["\']([^>]*)>', replace_tag, html, flags=re.I)
+    # 外部画像（file:/// や C:\ 形式の src）が無ければそのまま返す
+    if not html or "<img" not in html: return html
+    # 1) 外部ファイルを指す imgタグだけを集める
+    jobs = []
+    for m in _external_img_tags(html):
+        path = _external_image_path(m.group(2))
+        if path: jobs.append((m, (path, os.stat(path).st_mtime_ns)))
+    if not jobs: return html
+    # 2) デコード＋PNGエンコードは画像ごとに独立なので、複数あればスレッドで並列に行う
+    global _img_pool
+    if len(jobs) == 1:
+        urls = [_file_to_img_src(*jobs[0][1])]
+    else:
+        if _img_pool is None: _img_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 2)
+        urls = list(_img_pool.map(lambda key: _file_to_img_src(*key), [key for _, key in jobs]))
+    # 3) 置換結果をつなぎ合わせて1回で文字列化
+    out, pos = io.StringIO(), 0
+    for (m, _), url in zip(jobs, urls):
+        if url is None: continue # 読めない画像は元のタグのまま残す
+        out.write(html[pos:m.start()]); out.write(f"<img{m.group(1)}src=\"{url}\"{m.group(3)}>"); pos = m.end()
+    out.write(html[pos:])
+    return out.getvalue()
+
+_inline_memo: "OrderedDict[str, str]" = OrderedDict()
+
+def inline_external_images_cached(html: str) -> str:
+    """直近の入力HTMLに対する inline_external_images の結果を覚えておく（自動保存ごとの再エンコードを避ける）"""
+    res = _inline_memo.get(html)
+    if res is not None:
+        _inline_memo.move_to_end(html); return res
+    res = _inline_memo[html] = inline_external_images(html)
+    if len(_inline_memo) > 16: _inline_memo.popitem(last=False)
+    return res
 
 class SeparatorDelegate(QtWidgets.QStyledItemDelegate):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # 区切り線のペンは行ごとに作らず使い回す
+        self._sep_pen = QtGui.QPen(_QC_BORDER); self._sep_pen.setWidth(1); self._sep_pen.setCosmetic(True)
+
     def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex):
         super().paint(painter, option, index)
         painter.save()
-        pen = QtGui.QPen(QtGui.QColor(BORDER)); pen.setWidth(1)
-        painter.setPen(pen)
+        painter.setPen(self._sep_pen)
         y = option.rect.bottom() - 1
         painter.drawLine(option.rect.left() + 6, y, option.rect.right() - 6, y)
         painter.restore()
@@ -144,14 +446,36 @@ class SeparatorDelegate(QtWidgets.QStyledItemDelegate):
 
 
 class EmbedImageTextEdit(QtWidgets.QTextEdit):
+    def loadResource(self, type_: int, url: QtCore.QUrl):
+        """本文の benri-img:<名前> を images フォルダから読む（この編集欄を親に持つ文書からも呼ばれる）"""
+        if url.scheme() == IMG_SCHEME:
+            name = url.path()
+            if not _IMG_NAME_RE.match(name): return None
+            path = str(IMAGE_DIR / name)
+            try: return _load_qimage(path, os.stat(path).st_mtime_ns)
+            except OSError: return None
+        return super().loadResource(type_, url)
+
+    def createMimeDataFromSelection(self) -> QtCore.QMimeData:
+        """コピーする HTML の benri-img: を images フォルダの file:/// URL に直す（他のアプリに貼っても画像が出るように）"""
+        mime = super().createMimeDataFromSelection()
+        if mime.hasHtml():
+            html = mime.html()
+            if IMG_SCHEME in html:
+                mime.setHtml(_IMG_SRC_SCHEME_RE.sub(
+                    lambda m: QtCore.QUrl.fromLocalFile(str(IMAGE_DIR / m.group(1))).toString(), html))
+        return mime
+
     def canInsertFromMimeData(self, source: QtCore.QMimeData) -> bool:
         return source.hasImage() or source.hasUrls() or source.hasHtml() or source.hasText() or \
                super().canInsertFromMimeData(source)
 
     def insertFromMimeData(self, source: QtCore.QMimeData):
-        # 1. 画像データがあれば挿入
+        # 1. 画像データがあれば挿入（HTMLも付いていても、重いHTML処理より生画像を優先する）
         if source.hasImage():
-            qimg = QtGui.QImage(source.imageData())
+            data = source.imageData()
+            # imageData() は通常すでに QImage なので、コピーコンストラクタを通さない
+            qimg = _fit_image_width(data if isinstance(data, QtGui.QImage) else QtGui.QImage(data))
             if not qimg.isNull():
                 self.textCursor().insertHtml(_qimage_to_html_tag(qimg)); return
         # 2. URLがあれば、画像ファイルなら挿入、そうでなければURLをテキストとして挿入
@@ -159,11 +483,11 @@ class EmbedImageTextEdit(QtWidgets.QTextEdit):
             handled = False
             for url in source.urls():
                 if url.isLocalFile():
-                    path = url.toLocalFile().lower()
-                    if path.endswith((".png",".jpg",".jpeg",".bmp",".gif",".webp")):
-                        qimg = QtGui.QImage(url.toLocalFile())
+                    local = url.toLocalFile()
+                    if os.path.splitext(local)[1][1:].lower() in _IMG_EXTS:
+                        qimg = _load_qimage(local, os.stat(local).st_mtime_ns) if os.path.exists(local) else QtGui.QImage()
                         if not qimg.isNull():
-                            self.textCursor().insertHtml(_qimage_to_html_tag(qimg)); handled = True
+                            self.textCursor().insertHtml(_qimage_to_html_tag(qimg, _embed_format(local))); handled = True
                 if not handled:
                     self.textCursor().insertText(url.toString() + "\n")
                     handled = True
@@ -173,21 +497,16 @@ class EmbedImageTextEdit(QtWidgets.QTextEdit):
             html = source.html()
             # 外部画像（ファイルパス）をインライン化する
             def repl(m: re.Match) -> str:
-                src = m.group(1)
-                path = None
-                if src.lower().startswith("file:///"):
-                    path = QtCore.QUrl(src).toLocalFile()
-                elif re.match(r"^[a-zA-Z]:[\\/]", src):
-                    path = src
-                if path and os.path.exists(path):
-                    qimg = QtGui.QImage(path)
+                path = _external_image_path(m.group(1))
+                if path:
+                    qimg = _load_qimage(path, os.stat(path).st_mtime_ns)
                     if not qimg.isNull():
                         # 画像タグ全体をインライン化されたものに置き換え
-                        return _qimage_to_html_tag(qimg) 
+                        return _qimage_to_html_tag(qimg, _embed_format(path))
                 return m.group(0) # 処理できない場合は元のタグをそのまま残す
             
             # HTML内のimgタグを処理してインライン化
-            html_with_inline_imgs = re.sub(r'<img[^>]*\bsrc=["\']([^"\']+)["\'][^>]*>', repl, html, flags=re.I)
+            html_with_inline_imgs = _IMG_SRC_RE.sub(repl, html)
             self.insertHtml(html_with_inline_imgs); return
             
         super().insertFromMimeData(source)
@@ -222,7 +541,7 @@ class EmbedImageTextEdit(QtWidgets.QTextEdit):
         anchor = self.anchorAt(e.pos())
         if anchor:
             # Windowsパス形式のリンク C:\... がクリックされた場合に対応
-            if re.match(r"^[a-zA-Z]:[\\/]", anchor):
+            if _WINPATH_RE.match(anchor):
                 url = QtCore.QUrl.fromLocalFile(anchor)
             else:
                 url = QtCore.QUrl(anchor)
@@ -232,39 +551,107 @@ class EmbedImageTextEdit(QtWidgets.QTextEdit):
             QtGui.QDesktopServices.openUrl(url); e.accept(); return
         super().mouseReleaseEvent(e)
 
+class ArchiveBodyDialog(QtWidgets.QDialog):
+    """アーカイブ本文の編集ダイアログ。HTML のまま編集するので、書式や画像がプレーンテキストを経由して失われない"""
+    def __init__(self, html: str, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("アーカイブの本文"); self.resize(560, 420)
+        self.editor = EmbedImageTextEdit(); self.editor.setHtml(html); self.editor.document().setModified(False)
+        box = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        box.accepted.connect(self.accept); box.rejected.connect(self.reject)
+        v = QtWidgets.QVBoxLayout(self); v.addWidget(self.editor, 1); v.addWidget(box)
+
+    def html(self) -> Optional[str]:
+        """編集後の本文。手を付けていなければ None（toHtml で文書全体を書き出さない）"""
+        if not self.editor.document().isModified(): return None
+        return inline_external_images_cached(self.editor.toHtml())
+
+# アイコンは同じ引数なら同じ絵になるので、描いたピクスマップを QPixmapCache に載せて使い回す
+# さらに QIcon そのものを (size, rgba) をキーに lru_cache で保持し、2回目以降はピクスマップの取り出しも省く
 def make_icon_A_underline(size=18) -> QtGui.QIcon:
-    pm = QtGui.QPixmap(size, size); pm.fill(QtCore.Qt.GlobalColor.transparent)
-    p = QtGui.QPainter(pm); p.setRenderHint(QtGui.QPainter.Antialiasing, True)
-    font = QtGui.QFont("Segoe UI"); font.setBold(True); font.setPointSizeF(size * 0.65)
-    p.setFont(font); p.setPen(QtGui.QPen(QtGui.QColor(FG), 1))
-    rect = QtCore.QRectF(0, -2, size, size); p.drawText(rect, QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter, "A")
-    p.setPen(QtGui.QPen(QtGui.QColor(FG), 2, QtCore.Qt.SolidLine, QtCore.Qt.RoundCap))
-    y = int(size * 0.82); p.drawLine(int(size*0.18), y, int(size*0.82), y)
-    p.end(); return QtGui.QIcon(pm)
+    return _icon_A(size)
 
 def make_icon_palette(color: QtGui.QColor, size=18) -> QtGui.QIcon:
-    pm = QtGui.QPixmap(size, size); pm.fill(QtCore.Qt.GlobalColor.transparent)
-    p = QtGui.QPainter(pm); p.setRenderHint(QtGui.QPainter.Antialiasing, True)
+    return _icon_palette(color.rgba(), size)
+
+def make_icon_picture(size=18) -> QtGui.QIcon:
+    return _icon_picture(size)
+
+# 描画用のペン・ブラシは描画のたびに作らず、モジュール読み込み時に1回だけ用意する
+_FG_PEN0 = QtGui.QPen(_QC_FG, 0)
+_FG_PEN1 = QtGui.QPen(_QC_FG, 1)
+_FG_PEN2_ROUND = QtGui.QPen(_QC_FG, 2, QtCore.Qt.SolidLine, QtCore.Qt.RoundCap)
+_PAL_BODY_BRUSH = QtGui.QBrush(QtGui.QColor(245, 245, 245))
+_PIC_FRAME_BRUSH = QtGui.QBrush(QtGui.QColor("#eaeefc"))
+_PIC_HILL_BRUSH = QtGui.QBrush(QtGui.QColor("#b7d2ff"))
+_PIC_SUN_BRUSH = QtGui.QBrush(QtGui.QColor("#ffd866"))
+_ALIGN_CENTER = QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter
+_ICON_FONT_CACHE: Dict[int, QtGui.QFont] = {}  # QFont はアプリ起動後に作りたいので、初回使用時にサイズ別に作る
+
+def _icon_font(size: int) -> QtGui.QFont:
+    font = _ICON_FONT_CACHE.get(size)
+    if font is None:
+        font = QtGui.QFont("Segoe UI"); font.setBold(True); font.setPointSizeF(size * 0.65)
+        _ICON_FONT_CACHE[size] = font
+    return font
+
+def _icon_canvas(size: int) -> QtGui.QImage:
+    """アイコンの描画先。QPixmap ではなくラスタの QImage に描き、最後に1回だけ QPixmap に変換する"""
+    img = QtGui.QImage(size, size, QtGui.QImage.Format_ARGB32_Premultiplied); img.fill(0)
+    return img
+
+def _icon_finish(key: str, img: QtGui.QImage) -> QtGui.QIcon:
+    pm = QtGui.QPixmap.fromImage(img); QtGui.QPixmapCache.insert(key, pm); return QtGui.QIcon(pm)
+
+@lru_cache(maxsize=128)
+def _icon_A(size: int) -> QtGui.QIcon:
+    key = f"icon:A:{size}"; pm = QtGui.QPixmap()
+    if QtGui.QPixmapCache.find(key, pm): return QtGui.QIcon(pm)
+    img = _icon_canvas(size)
+    p = QtGui.QPainter(img); p.setRenderHint(QtGui.QPainter.Antialiasing, True)
+    p.setFont(_icon_font(size)); p.setPen(_FG_PEN1)
+    rect = QtCore.QRectF(0, -2, size, size); p.drawText(rect, _ALIGN_CENTER, "A")
+    p.setPen(_FG_PEN2_ROUND)
+    y = int(size * 0.82); p.drawLine(int(size*0.18), y, int(size*0.82), y)
+    p.end(); return _icon_finish(key, img)
+
+@lru_cache(maxsize=8)
+def _pal_shape(size: int) -> QtGui.QPainterPath:
+    """パレット本体（穴あき）の形。色に依存しないので、パスの減算はサイズごとに1回だけ行う"""
     path = QtGui.QPainterPath(); r = size - 2
     path.addRoundedRect(QtCore.QRectF(1, 2, r, r-2), size*0.3, size*0.3)
     hole = QtGui.QPainterPath(); hole.addEllipse(QtCore.QRectF(size*0.45, size*0.55, size*0.28, size*0.28))
-    shape = path.subtracted(hole)
-    p.fillPath(shape, QtGui.QBrush(QtGui.QColor(245,245,245))); p.setPen(QtGui.QPen(QtGui.QColor(FG), 1)); p.drawPath(shape)
-    p.setBrush(QtGui.QBrush(color)); p.setPen(QtGui.QPen(QtGui.QColor(FG), 1))
+    return path.subtracted(hole)
+
+@lru_cache(maxsize=256)
+def _icon_palette(rgba: int, size: int) -> QtGui.QIcon:
+    key = f"icon:pal:{size}:{rgba:08x}"; pm = QtGui.QPixmap()
+    if QtGui.QPixmapCache.find(key, pm): return QtGui.QIcon(pm)
+    img = _icon_canvas(size)
+    p = QtGui.QPainter(img); p.setRenderHint(QtGui.QPainter.Antialiasing, True)
+    shape = _pal_shape(size)
+    p.fillPath(shape, _PAL_BODY_BRUSH); p.setPen(_FG_PEN1); p.drawPath(shape)
+    p.setBrush(QtGui.QBrush(QtGui.QColor.fromRgba(rgba))) # 色が変わるのはこの丸だけ
     p.drawEllipse(QtCore.QRectF(size*0.18, size*0.22, size*0.28, size*0.28))
-    p.end(); return QtGui.QIcon(pm)
-
-def make_icon_picture(size=18) -> QtGui.QIcon:
-    pm = QtGui.QPixmap(size, size); pm.fill(QtCore.Qt.GlobalColor.transparent)
-    p = QtGui.QPainter(pm); p.setRenderHint(QtGui.QPainter.Antialiasing, True)
-    p.setPen(QtGui.QPen(QtGui.QColor(FG), 1)); p.setBrush(QtGui.QBrush(QtGui.QColor("#eaeefc")))
+    p.end(); return _icon_finish(key, img)
+
+@lru_cache(maxsize=128)
+def _icon_picture(size: int) -> QtGui.QIcon:
+    key = f"icon:pic:{size}"; pm = QtGui.QPixmap()
+    if QtGui.QPixmapCache.find(key, pm): return QtGui.QIcon(pm)
+    img = _icon_canvas(size)
+    p = QtGui.QPainter(img); p.setRenderHint(QtGui.QPainter.Antialiasing, True)
+    p.setPen(_FG_PEN1); p.setBrush(_PIC_FRAME_BRUSH)
     p.drawRoundedRect(1,3,size-2,size-6,4,4)
-    p.setBrush(QtGui.QBrush(QtGui.QColor("#b7d2ff")))
+    p.setBrush(_PIC_HILL_BRUSH)
     points = [QtCore.QPointF(size*0.2,size*0.7), QtCore.QPointF(size*0.45,size*0.45), QtCore.QPointF(size*0.75,size*0.75)]
     p.drawPolygon(QtGui.QPolygonF(points))
-    p.setBrush(QtGui.QBrush(QtGui.QColor("#ffd866"))); p.setPen(QtGui.QPen(QtGui.QColor(FG), 0))
+    p.setBrush(_PIC_SUN_BRUSH); p.setPen(_FG_PEN0)
     p.drawEllipse(QtCore.QRectF(size*0.58,size*0.22,size*0.16,size*0.16))
-    p.end(); return QtGui.QIcon(pm)
+    p.end(); return _icon_finish(key, img)
+
+def _clear_icon_caches():
+    for f in (_icon_A, _icon_palette, _icon_picture, _pal_shape): f.cache_clear()
 
 class RichBar(QtWidgets.QToolBar):
     htmlChanged = QtCore.Signal()
@@ -274,19 +661,23 @@ class RichBar(QtWidgets.QToolBar):
         super().__init__(parent)
         self.target = target
         self.setIconSize(QtCore.QSize(18, 18))
-        self.setStyleSheet("QToolBar{border:0; background: transparent;}")
+        # 書式は操作のたびに作らず使い回す（下線ON/OFF、文字色は色ごと）
+        self._underline_on_fmt = QtGui.QTextCharFormat(); self._underline_on_fmt.setFontUnderline(True)
+        self._underline_off_fmt = QtGui.QTextCharFormat(); self._underline_off_fmt.setFontUnderline(False)
+        self._color_fmts: Dict[int, QtGui.QTextCharFormat] = {}
+        self.setObjectName("richBar") # 見た目は MainWindow のスタイルシート（QToolBar#richBar）で指定
 
         self.actUnderline = QtGui.QAction(make_icon_A_underline(), "下線", self)
         self.actUnderline.setCheckable(True); self.actUnderline.toggled.connect(self.toggle_underline)
         self.addAction(self.actUnderline)
 
-        self._color = QtGui.QColor(FG)
+        self._color = _QC_FG
         self.actColor = QtGui.QAction(make_icon_palette(self._color), "文字色", self)
         self.actColor.triggered.connect(self.pick_text_color); self.addAction(self.actColor)
 
         self.addSeparator()
 
-        self._bg = QtGui.QColor(PANEL_BG)
+        self._bg = _QC_PANEL_BG
         self.actBG = QtGui.QAction(make_icon_palette(self._bg), "背景色（エディタ）", self)
         self.actBG.triggered.connect(self.pick_bg_color); self.addAction(self.actBG)
 
@@ -303,13 +694,16 @@ class RichBar(QtWidgets.QToolBar):
         self.addAction(self.actInsertLink)
 
     def toggle_underline(self, on: bool):
-        fmt = QtGui.QTextCharFormat(); fmt.setFontUnderline(on); self._merge(fmt)
+        self._merge(self._underline_on_fmt if on else self._underline_off_fmt)
 
     def pick_text_color(self):
         col = QtWidgets.QColorDialog.getColor(self._color, self, "文字色を選択")
         if col.isValid():
-            self._color = col; self.actColor.setIcon(make_icon_palette(self._color))
-            fmt = QtGui.QTextCharFormat(); fmt.setForeground(QtGui.QBrush(col)); self._merge(fmt)
+            if col != self._color: self._color = col; self.actColor.setIcon(make_icon_palette(col)) # 同じ色ならアイコンは差し替えない
+            fmt = self._color_fmts.get(col.rgba())
+            if fmt is None:
+                fmt = QtGui.QTextCharFormat(); fmt.setForeground(QtGui.QBrush(col)); self._color_fmts[col.rgba()] = fmt
+            self._merge(fmt)
 
     def _merge(self, fmt: QtGui.QTextCharFormat):
         cur = self.target.textCursor()
@@ -320,16 +714,15 @@ class RichBar(QtWidgets.QToolBar):
     def pick_bg_color(self):
         col = QtWidgets.QColorDialog.getColor(self._bg, self, "背景色（エディタ）を選択")
         if not col.isValid(): return
-        self._bg = col; self.actBG.setIcon(make_icon_palette(self._bg))
-        self.target.setStyleSheet(
-            f"QTextEdit{{background:{col.name()}; padding:6px; border:1px solid {BORDER}; border-radius:8px;}}"
-        )
+        if col != self._bg: self._bg = col; self.actBG.setIcon(make_icon_palette(col))
+        qss = editor_qss(col.name())
+        if self.target.styleSheet() != qss: self.target.setStyleSheet(qss) # 同じ色なら再適用（スタイル再計算）しない
         self.bgColorChanged.emit(col)
 
     def paste_image_from_clipboard(self):
         cb = QtWidgets.QApplication.clipboard()
         if img := cb.image():
-            qimg = QtGui.QImage(img)
+            qimg = _fit_image_width(QtGui.QImage(img))
             if not qimg.isNull():
                 self.target.textCursor().insertHtml(_qimage_to_html_tag(qimg)); self.htmlChanged.emit()
         else:
@@ -338,10 +731,10 @@ class RichBar(QtWidgets.QToolBar):
     def insert_image_from_file(self):
         path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "画像を選択", "", "画像ファイル (*.png *.jpg *.jpeg *.bmp *.gif *.webp)")
         if not path: return
-        qimg = QtGui.QImage(path)
+        qimg = _load_qimage(path, os.stat(path).st_mtime_ns)
         if qimg.isNull():
             QtWidgets.QMessageBox.warning(self, "失敗", "画像を読み込めませんでした。"); return
-        self.target.textCursor().insertHtml(_qimage_to_html_tag(qimg)); self.htmlChanged.emit()
+        self.target.textCursor().insertHtml(_qimage_to_html_tag(qimg, _embed_format(path))); self.htmlChanged.emit()
 
     def resize_selected_image(self):
         cur = self.target.textCursor()
@@ -364,6 +757,7 @@ class RichBar(QtWidgets.QToolBar):
         current_w = int(imgf.width()) if imgf.width() > 0 else 400
         new_w, ok = QtWidgets.QInputDialog.getInt(self, "画像の幅", "幅 (px)：", current_w, 48, 4000, 1)
         if not ok: return
+        if imgf.width() > 0 and new_w == current_w: return # 幅が変わらなければ書式をマージせず再レイアウトも起こさない
         imgf.setWidth(float(new_w))
         
         # 高さを自動調整（元の画像のアスペクト比を維持）
@@ -439,22 +833,31 @@ class ResidentListWidget(QtWidgets.QListWidget):
 # ToDoモデル（編集・色付き対応版）
 # =========================================================
 class TodoModel(QtCore.QAbstractListModel):
+    # data() が答えるロール。ビューは描画のたびに他のロール（アイコン・ツールチップ等）も問い合わせるので、先に弾く
+    _ROLES = frozenset(int(r) for r in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole, QtCore.Qt.FontRole, QtCore.Qt.BackgroundRole))
+
     def __init__(self, items: List[Dict[str, Any]]):
         super().__init__(); self.items = items
+        # 完了行の取り消し線フォントは描画のたびに作らず使い回す
+        self._strike_font = QtGui.QFont(); self._strike_font.setStrikeOut(True)
+        self._brushes: Dict[str, QtGui.QBrush] = {} # 色文字列 -> 背景ブラシ
 
     def rowCount(self, parent=QtCore.QModelIndex()): 
         return len(self.items)
 
     def data(self, index, role):
-        if not index.isValid(): return None
+        if role not in self._ROLES or not index.isValid(): return None
         it = self.items[index.row()]
-        if role == QtCore.Qt.DisplayRole:
+        if role == QtCore.Qt.DisplayRole or role == QtCore.Qt.EditRole:
             return it.get("title","")
         if role == QtCore.Qt.FontRole and it.get("done"):
-            f = QtGui.QFont(); f.setStrikeOut(True); return f
+            return self._strike_font
         if role == QtCore.Qt.BackgroundRole:
             col = it.get("color")
-            if col: return QtGui.QBrush(QtGui.QColor(col))
+            if col:
+                br = self._brushes.get(col)
+                if br is None: br = self._brushes[col] = QtGui.QBrush(QtGui.QColor(col))
+                return br
         return None
 
     def add(self, text: str, html: str = None):
@@ -471,14 +874,29 @@ class TodoModel(QtCore.QAbstractListModel):
         return new_row
 
     def toggle(self, row: int):
-        if 0 <= row < len(self.items):
-            self.items[row]["done"] = not self.items[row]["done"]
-            self.dataChanged.emit(self.index(row), self.index(row))
+        self.toggle_many([row])
+
+    def toggle_many(self, rows: List[int]):
+        """複数行の完了状態をまとめて反転し、dataChanged は1回だけ出す"""
+        rows = [r for r in rows if 0 <= r < len(self.items)]
+        if not rows: return
+        for r in rows: self.items[r]["done"] = not self.items[r]["done"]
+        self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [QtCore.Qt.FontRole]) # 変わるのは取り消し線だけ
 
     def remove(self, row: int):
-        if 0 <= row < len(self.items):
-            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
-            self.items.pop(row); self.endRemoveRows()
+        self.remove_rows([row])
+
+    def remove_rows(self, rows: List[int]):
+        """複数行を削除する。連続した行は1回の beginRemoveRows/endRemoveRows にまとめる（後ろから削除）"""
+        rows = sorted({r for r in rows if 0 <= r < len(self.items)}, reverse=True)
+        i = 0
+        while i < len(rows):
+            last = first = rows[i]
+            while i + 1 < len(rows) and rows[i + 1] == first - 1:
+                i += 1; first = rows[i]
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del self.items[first:last + 1]; self.endRemoveRows()
+            i += 1
 
     def flags(self, index):
         if not index.isValid():
@@ -489,11 +907,18 @@ class TodoModel(QtCore.QAbstractListModel):
         if not index.isValid():
             return False
         if role == QtCore.Qt.EditRole:
-            text = str(value).strip()
-            self.items[index.row()]["title"] = text
-            self.dataChanged.emit(index, index)
+            self.set_title(index.row(), str(value).strip())
             return True
         return False
+
+    def set_title(self, row: int, text: str):
+        """タイトルを書き換え、その1行の DisplayRole だけを通知する"""
+        self.items[row]["title"] = text
+        self.dataChanged.emit(self.index(row), self.index(row), [QtCore.Qt.DisplayRole, QtCore.Qt.EditRole])
+
+    def set_color(self, row: int, col: Optional[str]):
+        self.items[row]["color"] = col
+        self.dataChanged.emit(self.index(row), self.index(row), [QtCore.Qt.BackgroundRole])
         
     def get_item_by_row(self, row: int) -> Optional[Dict[str, Any]]:
         """行インデックスからアイテムを取得（安全なアクセス）"""
@@ -501,6 +926,124 @@ class TodoModel(QtCore.QAbstractListModel):
             return self.items[row]
         return None
 
+def _remove_identical(items: List[Dict[str, Any]], it: Dict[str, Any]):
+    """同一オブジェクトの要素を取り除く（list.remove は手前の要素と辞書の == 比較をしてしまう）
+    アーカイブは古い順に追記されていて、消すのはたいてい一覧の上にある新しい項目なので、末尾から探す"""
+    for i in range(len(items) - 1, -1, -1):
+        if items[i] is it: del items[i]; return
+
+_ARCHIVED_AT = itemgetter("archived_at")  # アーカイブの並べ替えキー（読み込み時に全項目へ archived_at を入れてある）
+
+@lru_cache(maxsize=256)
+def fmt_ts(ts: int) -> str:
+    """アーカイブ日時の表示用文字列（まとめてアーカイブした項目は同じ時刻なので使い回す）"""
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
+class ArchiveModel(QtCore.QAbstractListModel):
+    """ToDoアーカイブの表示用モデル（state のリストをそのまま参照し、新しい順に並べて見せる）"""
+    def __init__(self, items: List[Dict[str, Any]]):
+        super().__init__(); self.items = items
+        self._rows: List[Dict[str, Any]] = []  # 表示順（archived_at の降順）
+        self._keys: List[int] = []             # _rows と同じ並びの -archived_at（挿入位置を二分探索で求める）
+        self._labels: List[str] = []           # 表示文字列（描画のたびに日時を整形しない）
+        self._brushes: Dict[str, QtGui.QBrush] = {}
+        self.refresh()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return len(self._rows)
+
+    def data(self, index, role):
+        if not index.isValid(): return None
+        it = self._rows[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return self._labels[index.row()]
+        if role == QtCore.Qt.BackgroundRole:
+            col = it.get("color")
+            if col:
+                br = self._brushes.get(col)
+                if br is None: br = self._brushes[col] = QtGui.QBrush(QtGui.QColor(col))
+                return br
+        if role == QtCore.Qt.UserRole:
+            return it.get("id")
+        return None
+
+    @staticmethod
+    def _label(it: Dict[str, Any]) -> str:
+        return f"{fmt_ts(it.get('archived_at', 0))}  -  {it.get('title','')}"
+
+    def refresh(self):
+        """項目の追加後など、並び順ごと作り直す"""
+        self.beginResetModel()
+        self._rows = sorted(self.items, key=_ARCHIVED_AT, reverse=True)
+        self._keys = [-k for k in map(_ARCHIVED_AT, self._rows)]
+        self._labels = [self._label(it) for it in self._rows]
+        self.endResetModel()
+
+    def add(self, new_items: List[Dict[str, Any]]):
+        """state に追加済みの項目を、全体を並べ直さずに正しい位置へ差し込む
+        同じ位置に入る項目（まとめてアーカイブした同時刻の項目）は1回の beginInsertRows/endInsertRows にまとめる"""
+        items = sorted(new_items, key=_ARCHIVED_AT, reverse=True) # 安定ソートなので同時刻の項目は渡された順のまま
+        i = 0
+        while i < len(items):
+            k = -items[i]["archived_at"]; j = i + 1
+            while j < len(items) and -items[j]["archived_at"] == k: j += 1
+            run = items[i:j]; pos = bisect.bisect_right(self._keys, k)
+            self.beginInsertRows(QtCore.QModelIndex(), pos, pos + len(run) - 1)
+            self._keys[pos:pos] = [k] * len(run); self._rows[pos:pos] = run; self._labels[pos:pos] = [self._label(it) for it in run]
+            self.endInsertRows()
+            i = j
+
+    def relabel(self):
+        """表示文字列だけを作り直す（並び順は変わらないので並べ替えない）"""
+        if not self._rows: return
+        self._labels = [self._label(it) for it in self._rows]
+        self.dataChanged.emit(self.index(0), self.index(len(self._rows) - 1), [QtCore.Qt.DisplayRole])
+
+    def item_changed(self, row: int):
+        """タイトル・色の変更（並び順は変わらない）を1行だけ通知する"""
+        if 0 <= row < len(self._rows):
+            self._labels[row] = self._label(self._rows[row])
+            self.dataChanged.emit(self.index(row), self.index(row))
+
+    def remove_row(self, row: int):
+        if 0 <= row < len(self._rows):
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            it = self._rows.pop(row); del self._labels[row]; del self._keys[row]
+            _remove_identical(self.items, it)
+            self.endRemoveRows()
+
+    def remove_items(self, items: List[Dict[str, Any]]):
+        """指定した項目（同じオブジェクト）の行だけを取り除く。残りの並び順は変わらないので並べ直さず、
+        連続した行は1回の beginRemoveRows/endRemoveRows にまとめる（後ろから削除）"""
+        gone = {id(it) for it in items}
+        rows = [r for r, it in enumerate(self._rows) if id(it) in gone]
+        if not rows: return
+        i = len(rows) - 1
+        while i >= 0:
+            first = last = rows[i]
+            while i > 0 and rows[i - 1] == first - 1:
+                i -= 1; first = rows[i]
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del self._rows[first:last + 1]; del self._labels[first:last + 1]; del self._keys[first:last + 1]
+            self.endRemoveRows()
+            i -= 1
+        self.items[:] = [it for it in self.items if id(it) not in gone]
+
+    def get_item_by_row(self, row: int) -> Optional[Dict[str, Any]]:
+        if 0 <= row < len(self._rows):
+            return self._rows[row]
+        return None
+
+class ResidentArchiveModel(ArchiveModel):
+    """常駐アーカイブの表示用モデル（全カテゴリのアーカイブを1本にまとめたリストを参照する）"""
+    def data(self, index, role):
+        if role == QtCore.Qt.BackgroundRole: return None # 常駐アーカイブは色分けしない
+        return super().data(index, role)
+
+    @staticmethod
+    def _label(it: Dict[str, Any]) -> str:
+        return f"[{it.get('original_category', '不明')}] {fmt_ts(it.get('archived_at', 0))} - {it.get('title','')}"
+
 # =========================================================
 # デフォルト状態
 # =========================================================
@@ -515,31 +1058,62 @@ DEFAULT_STATE: Dict[str, Any] = {
 # MainWindow（UI構築〜起動直後セットアップ）
 # =========================================================
 class MainWindow(QtWidgets.QMainWindow):
+    _saveFinished = QtCore.Signal(bool)  # バックグラウンド保存の完了通知（ワーカー → UIスレッド）
+    _EDIT_DETAIL, _EDIT_FREE = 1, 2  # _dirty_mask のビット（詳細欄／フリースペース）
+    _DETAIL_DOCS_MAX = 16            # 解析済みの詳細文書を何件まで持っておくか
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle(APP_TITLE)
         self.setWindowIcon(QtGui.QIcon.fromTheme("sticky-notes"))
         self.prev_geometry: Optional[QtCore.QRect] = None
+        self._dirty: set = set()  # 前回の保存以降に変更されたファイル（"notes" = notes.json, "memo2" = memo2.html, "conf" = window.json）
+        self._save_running = False  # 保存ワーカーが実行中か
+        self._save_pending = False  # 実行中に次の保存要求が来たか
+        self._save_inflight: Tuple[set, list] = (set(), [])  # 実行中の保存が受け持つ (_dirty, _archive_log)
+        self._archive_log: List[Tuple[str, Tuple[Optional[str], str], str]] = []  # まだ archive.ndjson に追記していないアーカイブ操作 (op, (格納先, id), 行)
+        self._archive_appended = False     # 前回詰め直してから archive.ndjson に追記したか
+        self._archive_split = ARCHIVE_FILE.exists() # アーカイブを notes.json ではなく archive.ndjson に持つか
+        self._resident_rows_moved = False  # 直前のドロップで rowsMoved により state を並べ替え済みか
+        self._saveFinished.connect(self._on_save_finished)
+        self._last_state_pending = False  # _save_last_state の書き込みが予約済みか
+        # 保存の遅延タイマー（変更が続く間は待ち、落ち着いてから1回だけ書き込む）
+        self.saveTimer = QtCore.QTimer(self); self.saveTimer.setSingleShot(True); self.saveTimer.setInterval(500)
+        self.saveTimer.timeout.connect(self._save_all)
+        self._confTimer = QtCore.QTimer(self); self._confTimer.setSingleShot(True); self._confTimer.setInterval(500)
+        self._confTimer.timeout.connect(self._flush_window_conf)
+        self._geom_dirty = False  # 移動・リサイズ後、まだ geometry を読んでいないか
+        # 終了時は待たずに書き出す
+        QtWidgets.QApplication.instance().aboutToQuit.connect(self._flush_pending_saves)
         self._detail_ref_uuid: Optional[str] = None # 📌 常駐事項の選択UUIDを保持
         self._detail_ref: Optional[Tuple] = None     # 📌 詳細が現在参照しているアイテム情報 (e.g., ("todo", row) or ("resident", cat_name, item_id))
+        self._html_intern: Dict[bytes, str] = {}     # 内容ハッシュ -> 共有HTML文字列（同一本文を1つの参照にまとめる）
 
         self.state = load_json(DATA_FILE, DEFAULT_STATE)
         self.conf = load_json(CONF_FILE, {"geometry": None})
+        if MEMO2_FILE.exists():
+            raw = MEMO2_FILE.read_bytes(); remember_bytes(MEMO2_FILE, raw)
+            self.state["memo2"] = {"html": raw.decode("utf-8")}
+        else:
+            # 旧形式（notes.json に memo2 を含む）からの移行：notes.json から memo2 を外す書き込み（移行処理・次の保存）より先に、
+            # memo2.html を同期して書き出しておく（アーカイブを archive.ndjson に分けるときと同じ順序）
+            self.state.setdefault("memo2", {"html": ""})
+            save_bytes(MEMO2_FILE, self.state["memo2"]["html"].encode("utf-8"), durable=True)
+            self._dirty.add("notes"); self.saveTimer.start()
+
+        # 参照されなくなった画像を片付ける（まだ何も貼り付けられていない今のうちに、ディスク上の内容だけを見て判断する）
+        if DATA_FILE.exists(): gc_stored_images(DATA_FILE, MEMO2_FILE, ARCHIVE_FILE)
 
         # 旧データのtitle移行 & 常駐構造の整備（起動後のデータ整備）
         self._migrate_data_structure()
+        self._load_archive()
+        self._intern_state_html()
         
         self._apply_global_style()
 
         # ===== Top Toolbar =====
-        self.topBar = QtWidgets.QToolBar()
+        self.topBar = QtWidgets.QToolBar(objectName="topBar")
         self.topBar.setMovable(False); self.topBar.setIconSize(QtCore.QSize(18,18))
-        self.topBar.setStyleSheet(f"""
-            QToolBar{{padding:6px; border:0; background: {BG};}}
-            QToolButton{{padding:6px 12px; border:1px solid {BORDER}; border-radius:8px; background:{PANEL_BG};}}
-            QToolButton:checked{{background:{ACCENT_WEAK}; border-color:{ACCENT}; color:{FG};}}
-            QToolButton:hover{{border-color:{ACCENT_HOVER};}}
-        """)
         self.addToolBar(QtCore.Qt.TopToolBarArea, self.topBar)
 
         self.actOnTop = QtGui.QAction("常に手前に表示", self, checkable=True, checked=False)
@@ -549,74 +1123,66 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # ===== 右：詳細 & フリースペース =====
         # 詳細欄
-        self.detailEditor = EmbedImageTextEdit()
-        self.detailEditor.setStyleSheet(f"QTextEdit{{background:{PANEL_BG}; padding:6px; border:1px solid {BORDER}; border-radius:8px;}}")
-        self.detailBar = RichBar(self.detailEditor)
-        self.detailLabel = QtWidgets.QLabel("詳細"); self.detailLabel.setStyleSheet(f"font-weight:bold; color:{FG};")
+        self.detailEditor = EmbedImageTextEdit(objectName="editorDetail")
+        # setDocument は、エディタ自身が作った文書を差し替え時に削除するので、未選択時用の文書もこちらで持つ
+        self._blank_doc = QtGui.QTextDocument(self.detailEditor); self.detailEditor.setDocument(self._blank_doc)
+        self._detail_docs: "OrderedDict[str, Tuple[str, QtGui.QTextDocument]]" = OrderedDict()  # 項目ID -> (読み込んだ html, 文書)
+        self.detailLabel = QtWidgets.QLabel("詳細", objectName="sectionLabel")
         btnResizeImgDetail = QtWidgets.QPushButton("画像サイズ変更")
-        btnResizeImgDetail.clicked.connect(self.detailBar.resize_selected_image)
 
         # ▼ 詳細欄の背景色 永続化（CONF_FILE: editor_bg.detail）
         bg_conf = self.conf.get("editor_bg", {})
-        detail_bg = bg_conf.get("detail")
-        if detail_bg:
-            self.detailEditor.setStyleSheet(
-                f"QTextEdit{{background:{detail_bg}; padding:6px; border:1px solid {BORDER}; border-radius:8px;}}"
-            )
-        self.detailBar.bgColorChanged.connect(lambda col: self._save_editor_bg("detail", col))
+        if bg_conf.get("detail"): self.detailEditor.setStyleSheet(editor_qss(bg_conf["detail"])) # 既定色は全体のスタイルシート側
 
         # 入力遅延タイマー (入力終了後にメモリ上のデータに反映)
-        self._detailTimer = QtCore.QTimer(self); self._detailTimer.setSingleShot(True); self._detailTimer.setInterval(400)
-        self.detailEditor.textChanged.connect(lambda: self._detailTimer.start())
-        self._detailTimer.timeout.connect(self._apply_detail_to_state)
+        # 詳細欄とフリースペースで1つのタイマーを共有し、どちらが編集されたかは _dirty_mask で持つ
+        self._editTimer = QtCore.QTimer(self); self._editTimer.setSingleShot(True); self._editTimer.setInterval(400)
+        self._dirty_mask = 0
+        self._detail_rev = self._free_rev = -1  # 最後に state へ反映した時点の QTextDocument.revision()
+        self.detailEditor.textChanged.connect(lambda: self._on_editor_changed(self._EDIT_DETAIL))
+        self._editTimer.timeout.connect(self._flush_editors)
 
         detailPane = QtWidgets.QWidget(); v1 = QtWidgets.QVBoxLayout(detailPane)
         v1.setContentsMargins(10,10,5,10); v1.setSpacing(6)
-        v1.addWidget(self.detailLabel); v1.addWidget(self.detailBar)
+        v1.addWidget(self.detailLabel)
         v1.addWidget(btnResizeImgDetail, alignment=QtCore.Qt.AlignLeft)
         v1.addWidget(self.detailEditor, 1)
 
         # フリースペース
-        self.memoFree = EmbedImageTextEdit()
+        self.memoFree = EmbedImageTextEdit(objectName="editorFree")
         self.memoFree.setHtml(self.state["memo2"]["html"])
-        # 📌 修正: _on_free_html_changed内から_save_allを削除し、メモリへの反映のみに
-        self.memoFree.textChanged.connect(self._on_free_html_changed) 
-        self.memoFree.setStyleSheet(f"QTextEdit{{background:{PANEL_BG}; padding:6px; border:1px solid {BORDER}; border-radius:8px;}}")
-        self.memoFreeBar = RichBar(self.memoFree)
-        labFree = QtWidgets.QLabel("フリースペース"); labFree.setStyleSheet(f"font-weight:bold; color:{FG};")
-        btnResizeImgFree = QtWidgets.QPushButton("画像サイズ変更"); btnResizeImgFree.clicked.connect(self.memoFreeBar.resize_selected_image)
+        # 📌 修正: 入力時は印を付けるだけ。toHtml() は保存タイマー満了時に1回だけ行う
+        self.memoFree.textChanged.connect(self._on_free_changed)
+        labFree = QtWidgets.QLabel("フリースペース", objectName="sectionLabel")
+        btnResizeImgFree = QtWidgets.QPushButton("画像サイズ変更")
 
         # ▼ メモ欄の背景色 永続化（CONF_FILE: editor_bg.memo2）
-        memo_bg = bg_conf.get("memo2")
-        if memo_bg:
-            self.memoFree.setStyleSheet(
-                f"QTextEdit{{background:{memo_bg}; padding:6px; border:1px solid {BORDER}; border-radius:8px;}}"
-            )
-        self.memoFreeBar.bgColorChanged.connect(lambda col: self._save_editor_bg("memo2", col))
+        if bg_conf.get("memo2"): self.memoFree.setStyleSheet(editor_qss(bg_conf["memo2"]))
 
         freePane = QtWidgets.QWidget(); v2 = QtWidgets.QVBoxLayout(freePane)
         v2.setContentsMargins(5,10,10,10); v2.setSpacing(6)
-        v2.addWidget(labFree); v2.addWidget(self.memoFreeBar)
+        v2.addWidget(labFree)
+        # 書式ツールバーは見出しラベルの直後に _build_rich_bars で差し込む（属性名, レイアウト, 対象エディタ, 背景色の保存キー, 画像サイズ変更ボタン）
+        self._rich_bar_slots = (("detailBar", v1, self.detailEditor, "detail", btnResizeImgDetail),
+                                ("memoFreeBar", v2, self.memoFree, "memo2", btnResizeImgFree))
         v2.addWidget(btnResizeImgFree, alignment=QtCore.Qt.AlignLeft)
         v2.addWidget(self.memoFree, 1)
 
-        rightSplitter = QtWidgets.QSplitter(QtCore.Qt.Horizontal)
+        rightSplitter = QtWidgets.QSplitter(QtCore.Qt.Horizontal, objectName="rightSplitter")
         rightSplitter.addWidget(detailPane); rightSplitter.addWidget(freePane)
         rightSplitter.setStretchFactor(0, 1); rightSplitter.setStretchFactor(1, 1)
         rightSplitter.setChildrenCollapsible(False); rightSplitter.setHandleWidth(10)
-        rightSplitter.setStyleSheet(f"""
-            QSplitter::handle {{
-                background: {HANDLE};
-                border-left: 1px solid {BORDER};
-                border-right: 1px solid {BORDER};
-                margin: 6px 0;
-            }}
-        """)
         rightWrap = QtWidgets.QWidget()
         vrw = QtWidgets.QVBoxLayout(rightWrap); vrw.setContentsMargins(0,0,0,8); vrw.addWidget(rightSplitter)
 
         # ===== 左：ToDo / アーカイブ =====
+        # 編集しない一覧（アーカイブ・常駐項目）は区切り線デリゲートを1つ共有する
+        # （編集する ToDo 一覧は closeEditor が他のビューに届かないよう専用のものを持つ）
+        self._sep_delegate = SeparatorDelegate(self)
         self.todoModel = TodoModel(self.state["todo"]["items"])
+        for sig in (self.todoModel.dataChanged, self.todoModel.rowsInserted, self.todoModel.rowsRemoved,
+                    self.todoModel.layoutChanged, self.todoModel.modelReset):
+            sig.connect(self._mark_dirty)
         self.todoList = QtWidgets.QListView(); self.todoList.setModel(self.todoModel)
         self.todoList.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
         self.todoList.setEditTriggers(QtWidgets.QAbstractItemView.DoubleClicked | QtWidgets.QAbstractItemView.EditKeyPressed)
@@ -647,9 +1213,11 @@ class MainWindow(QtWidgets.QMainWindow):
         hb2.addWidget(btnDel); hb2.addWidget(btnColor)
         vct.addLayout(hb2)
 
-        self.archiveList = QtWidgets.QListWidget(); self._refresh_todo_archive_list()
-        self.archiveList.setItemDelegate(SeparatorDelegate(self.archiveList))
-        self.archiveList.itemDoubleClicked.connect(self._edit_archive_item)
+        self.archiveModel = ArchiveModel(self.state["todo"]["archive"])
+        self.archiveList = QtWidgets.QListView(); self.archiveList.setModel(self.archiveModel)
+        self.archiveList.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.archiveList.setItemDelegate(self._sep_delegate)
+        self.archiveList.doubleClicked.connect(self._edit_archive_item)
         self.archiveList.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.archiveList.customContextMenuRequested.connect(self._show_archive_context_menu)
 
@@ -665,9 +1233,11 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # ===== 左：常駐カテゴリ（タブ） =====
         self.residentTabs = QtWidgets.QTabWidget()
+        self._cat_tab_index: Dict[str, int] = {}  # タブ名 -> インデックス（_reindex_resident_tabs で更新）
         self.residentTabs.setTabsClosable(False)
         self.residentTabs.setMovable(True)
         self.residentTabs.tabBar().installEventFilter(self)
+        self.residentTabs.tabBar().tabMoved.connect(self._on_resident_tab_moved)
 
         btnAddCat = QtWidgets.QToolButton(); btnAddCat.setText("＋"); btnAddCat.clicked.connect(self._add_resident_tab)
         btnRenCat = QtWidgets.QToolButton(); btnRenCat.setText("改"); btnRenCat.clicked.connect(self._rename_resident_tab)
@@ -675,7 +1245,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         leftBottom = QtWidgets.QWidget()
         vlb = QtWidgets.QVBoxLayout(leftBottom); vlb.setContentsMargins(8,0,8,8)
-        titleCat = QtWidgets.QLabel("常駐事項"); titleCat.setStyleSheet(f"font-weight: bold; color: {FG};")
+        titleCat = QtWidgets.QLabel("常駐事項", objectName="sectionLabel")
         toolRow = QtWidgets.QHBoxLayout(); toolRow.addWidget(titleCat); toolRow.addStretch(1)
         toolRow.addWidget(btnAddCat); toolRow.addWidget(btnRenCat); toolRow.addWidget(btnDelCat)
         vlb.addLayout(toolRow); vlb.addWidget(self.residentTabs)
@@ -683,39 +1253,38 @@ class MainWindow(QtWidgets.QMainWindow):
         self._rebuild_resident_tabs()
 
         # ===== 左の上下スプリッタ =====
-        leftSplit = QtWidgets.QSplitter(QtCore.Qt.Vertical)
+        leftSplit = QtWidgets.QSplitter(QtCore.Qt.Vertical, objectName="leftSplit")
         leftSplit.addWidget(self.centerTabs); leftSplit.addWidget(leftBottom)
         leftSplit.setStretchFactor(0, 3); leftSplit.setStretchFactor(1, 7)
         leftSplit.setHandleWidth(10)
-        leftSplit.setStyleSheet(f"QSplitter::handle{{background:{HANDLE}; border:1px solid {BORDER};}}")
 
         # ===== 全体スプリッタ =====
-        splitter = QtWidgets.QSplitter()
+        splitter = QtWidgets.QSplitter(objectName="mainSplitter")
         splitter.addWidget(leftSplit); splitter.addWidget(rightWrap)
         splitter.setStretchFactor(0, 1); splitter.setStretchFactor(1, 3)
         splitter.setHandleWidth(10)
-        splitter.setStyleSheet(f"""
-            QSplitter::handle {{
-                background: {HANDLE};
-                border-left: 1px solid {BORDER};
-                border-right: 1px solid {BORDER};
-            }}
-        """)
         self.setCentralWidget(splitter)
 
         # 起動時は必ず OnTop OFF
-        self._force_standard_window_buttons()
+        self._on_top_state = False
         self._apply_on_top(False, first_time=True)
 
+        # 画面の作業領域はキャッシュし、画面構成が変わったときだけ捨てる
+        self._avail_cache: Optional[Tuple[QtCore.QRect, int, int, int, int]] = None
+        gapp = QtGui.QGuiApplication.instance()
+        gapp.screenAdded.connect(self._invalidate_avail); gapp.screenRemoved.connect(self._invalidate_avail)
+        gapp.primaryScreenChanged.connect(self._on_primary_screen_changed); self._on_primary_screen_changed(gapp.primaryScreen())
+
         # ウィンドウ復元
         self._restore_geometry()
 
-        # トレイ
-        self._setup_tray()
+        # トレイ（起動直後の描画を優先し、イベントループに入ってから作る）
+        QtCore.QTimer.singleShot(0, self._setup_tray)
+        # 書式ツールバーも同様に、最初の表示が済んでから作る
+        QtCore.QTimer.singleShot(0, self._build_rich_bars)
 
-        # 定期保存
-        self.saveTimer = QtCore.QTimer(self); self.saveTimer.setInterval(2000)
-        self.saveTimer.timeout.connect(self._save_all); self.saveTimer.start()
+        # 明示保存（Ctrl+S）は fsync まで行う
+        QtGui.QShortcut(QtGui.QKeySequence.Save, self, activated=self._save_now)
 
         # 詳細初期状態 + 初期選択
         self._load_detail(None)
@@ -726,21 +1295,31 @@ class MainWindow(QtWidgets.QMainWindow):
         # ▼ 最終状態の保存トリガ
         self.centerTabs.currentChanged.connect(self._save_last_state)
         self.todoList.selectionModel().currentChanged.connect(lambda *_: self._save_last_state())
+        self.residentTabs.currentChanged.connect(self._ensure_resident_tab_built)
         self.residentTabs.currentChanged.connect(lambda *_: self._save_last_state())
 
         # ▼ 起動時に前回ページ復元
         self._restore_last_state()
         
+    def _build_rich_bars(self):
+        for attr, layout, editor, key, btn in self._rich_bar_slots:
+            bar = RichBar(editor); setattr(self, attr, bar)
+            btn.clicked.connect(bar.resize_selected_image)
+            bar.bgColorChanged.connect(lambda col, k=key: self._save_editor_bg(k, col))
+            layout.insertWidget(1, bar)
+        del self._rich_bar_slots
+
     # ====== データ構造の整備（後方互換性対応） ======
     def _migrate_data_structure(self):
         """古いデータ構造から新しい構造への移行と、必須フィールドの追加を行う"""
-        changed = False
+        # 移行済みのデータなら全件の走査は不要
+        if self.state.get("_schema_version", 0) >= CURRENT_SCHEMA: return
         
         # 1. ToDoの'text'を'title'へ移行、IDがない場合は付与
         for target in [self.state["todo"]["items"], self.state["todo"]["archive"]]:
             for it in target:
-                if "title" not in it: it["title"] = it.pop("text",""); changed = True
-                if "id" not in it: it["id"] = str(uuid.uuid4()); changed = True
+                if "title" not in it: it["title"] = it.pop("text","")
+                if "id" not in it: it["id"] = str(uuid.uuid4())
         
         # 2. 常駐事項の構造を整備（カテゴリ自体がHTMLだった場合の移行）
         cats = self.state.get("categories", {})
@@ -751,7 +1330,6 @@ class MainWindow(QtWidgets.QMainWindow):
                 if html:
                     # 旧カテゴリHTMLを項目化
                     cats[name]["items"].append({"id": str(uuid.uuid4()), "title": "メモ", "html": html})
-                changed = True
             
             # 3. 常駐事項の項目に必須フィールドを付与
             if isinstance(cats.get(name), dict):
@@ -759,10 +1337,56 @@ class MainWindow(QtWidgets.QMainWindow):
                 cats[name].setdefault("archive", [])
                 for target in [cats[name]["items"], cats[name]["archive"]]:
                     for item in target:
-                        if "id" not in item: item["id"] = str(uuid.uuid4()); changed = True
+                        if "id" not in item: item["id"] = str(uuid.uuid4())
                         item.setdefault("title", "無題"); item.setdefault("html", "")
-                        
-        if changed: save_json(DATA_FILE, self.state)
+
+        # 移行済みの印を付けて一度だけ書き戻す（次回起動からは上の走査を丸ごと省く）
+        self.state["_schema_version"] = CURRENT_SCHEMA
+        save_json(DATA_FILE, self._notes_snapshot(), durable=True)
+
+    def _load_archive(self):
+        """アーカイブを archive.ndjson から読み込む（無ければ notes.json 内のアーカイブから作る）"""
+        loaded = load_archive_log(ARCHIVE_FILE) if self._archive_split else None
+        if loaded is None:
+            # 旧形式からの移行：先にアーカイブを書き出し、次の保存で notes.json からアーカイブを外す
+            self.state["todo"].setdefault("archive", [])
+            for cat in self.state["categories"].values(): cat.setdefault("archive", [])
+            write_bytes_atomic(ARCHIVE_FILE, archive_compact(self._archive_lists()), durable=True)
+            self._archive_split = True; self._mark_dirty()
+        else:
+            lists, intact = loaded
+            if not intact: self._mark_archive_dirty()
+            self.state["todo"]["archive"] = lists.get(None, [])
+            for name, cat in self.state["categories"].items(): cat["archive"] = lists.get(name, [])
+        # 並べ替えで itemgetter を使えるよう、日時の無い項目には 0（表示上の既定と同じ）を入れておく
+        for items in self._archive_lists().values():
+            for it in items:
+                if "archived_at" not in it: it["archived_at"] = 0
+
+    def _archive_lists(self) -> Dict[Optional[str], List[Dict[str, Any]]]:
+        """格納先（カテゴリ名、ToDo は None）ごとのアーカイブ配列"""
+        lists: Dict[Optional[str], List[Dict[str, Any]]] = {None: self.state["todo"]["archive"]}
+        for name, cat in self.state["categories"].items(): lists[name] = cat["archive"]
+        return lists
+
+    def _intern_state_html(self):
+        """同一内容のHTML本文は1つの文字列を共有する"""
+        for target in [self.state["todo"]["items"], self.state["todo"]["archive"]]:
+            for it in target:
+                if it.get("html"): it["html"] = self._intern_html(it["html"])
+        for val in self.state["categories"].values():
+            for target in [val["items"], val["archive"]]:
+                for item in target:
+                    if item.get("html"): item["html"] = self._intern_html(item["html"])
+
+    def _intern_html(self, html: str) -> str:
+        """内容が同じHTMLなら既存の文字列を返す（同一性比較で変更判定できるようにする）"""
+        h = hashlib.blake2b(html.encode("utf-8"), digest_size=16).digest()
+        s = self._html_intern.get(h)
+        if s is None:
+            if len(self._html_intern) >= 1024: self._html_intern.clear() # 編集途中の古い版が溜まり続けないように
+            s = self._html_intern[h] = html
+        return s
 
 
     # ====== 常駐カテゴリ UI ======
@@ -778,51 +1402,82 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # 順序リストを再構成（古いカテゴリも落とさない）
         order = list(self.state.get("category_order", []))
-        for k in self.state["categories"].keys():
-            if k not in order:
-                order.append(k)
-        self.state["category_order"] = order
-
-        # 通常カテゴリを追加
+        seen = set(order)
+        for k in self.state["categories"]:
+            if k not in seen:
+                order.append(k); seen.add(k)
+        if order != self.state.get("category_order"):
+            self.state["category_order"] = order; self._mark_dirty()
+
+        # 通常カテゴリを追加（中身は初めて開いたときに作る）
         for name in order:
             # カテゴリが存在しない場合はスキップ (データが消えた場合などに備えて)
             if name not in self.state["categories"]: continue
-            self.residentTabs.addTab(self._build_category_widget(name), name)
+            self.residentTabs.addTab(self._lazy_category_tab(name), name)
 
         # ★ ここでアーカイブタブを追加（常に最後）
         self.residentTabs.addTab(self._build_resident_archive_widget(), "アーカイブ")
-
-        # tabMovedシグナル再接続（重複防止）
-        try:
-            self.residentTabs.tabBar().tabMoved.disconnect()
-        except TypeError:
-            pass
-        self.residentTabs.tabBar().tabMoved.connect(self._on_resident_tab_moved)
+        self._reindex_resident_tabs()
 
         # ---- 選択復元 ----
         # 直前に開いていたタブを再選択（なければ一番前）
-        restored = False
-        if current_text:
-            for i in range(self.residentTabs.count()):
-                if self.residentTabs.tabText(i) == current_text:
-                    self.residentTabs.setCurrentIndex(i)
-                    restored = True
-                    break
+        restored = bool(current_text) and self._select_resident_tab(current_text)
         if not restored and self.residentTabs.count() > 0:
             self.residentTabs.setCurrentIndex(0)
 
+        self._ensure_resident_tab_built(self.residentTabs.currentIndex(), notify=True)
         self.residentTabs.blockSignals(False)
 
-    def _build_category_widget(self, cat_name: str) -> QtWidgets.QWidget:
+    def _reindex_resident_tabs(self):
+        """タブ名 -> インデックスを作り直す（タブの追加・削除・名前変更・並べ替えのあとに呼ぶ）"""
+        self._cat_tab_index = {self.residentTabs.tabText(i): i for i in range(self.residentTabs.count())}
+
+    @staticmethod
+    def _lazy_category_tab(name: str) -> QtWidgets.QWidget:
+        """カテゴリタブのプレースホルダー（中身は _ensure_resident_tab_built が初めて開いたときに作る）"""
+        ph = QtWidgets.QWidget(); ph.setProperty("cat_name", name); ph.setProperty("lazy", True)
+        return ph
+
+    def _reload_resident_tab(self, index: int, name: str):
+        """1つのカテゴリタブだけを作り直す（他のタブには触らない）。表示中のタブならすぐに中身を作る"""
+        blocked = self.residentTabs.blockSignals(True)
+        cur = self.residentTabs.currentIndex(); old = self.residentTabs.widget(index)
+        self.residentTabs.removeTab(index); self.residentTabs.insertTab(index, self._lazy_category_tab(name), name)
+        self.residentTabs.setCurrentIndex(cur)
+        self.residentTabs.blockSignals(blocked)
+        old.deleteLater(); self._reindex_resident_tabs()
+        if index == cur: self._ensure_resident_tab_built(index, notify=True)
+
+    def _select_resident_tab(self, name: str) -> bool:
+        """名前でタブを選択する（見つからなければ False）"""
+        i = self._cat_tab_index.get(name, -1)
+        if i < 0: return False
+        self.residentTabs.setCurrentIndex(i); return True
+
+    def _ensure_resident_tab_built(self, index: int, notify: bool = False):
+        """プレースホルダーのままのカテゴリタブを実体のウィジェットに置き換える"""
+        ph = self.residentTabs.widget(index)
+        if ph is None or not ph.property("lazy"): return
+        name = self.residentTabs.tabText(index)
+        w = self._build_category_widget(name, notify)
+        blocked = self.residentTabs.blockSignals(True)
+        cur = self.residentTabs.currentIndex()
+        self.residentTabs.removeTab(index); self.residentTabs.insertTab(index, w, name)
+        self.residentTabs.setCurrentIndex(cur)
+        self.residentTabs.blockSignals(blocked)
+        ph.deleteLater()
+
+    def _build_category_widget(self, cat_name: str, notify: bool = True) -> QtWidgets.QWidget:
         wrap = QtWidgets.QWidget()
         wrap.setProperty("cat_name", cat_name) 
         v = QtWidgets.QVBoxLayout(wrap); v.setContentsMargins(6,6,6,6); v.setSpacing(6)
 
         lst = ResidentListWidget(cat_name, self, objectName=f"list_{cat_name}") 
-        lst.setStyleSheet(f"QListWidget{{background:{PANEL_BG}; border:1px solid {BORDER}; border-radius:8px;}}")
-        lst.setItemDelegate(SeparatorDelegate(lst))
+        lst.setItemDelegate(self._sep_delegate)
 
         lst.set_callbacks(self._on_resident_selected, self._update_resident_items_order_from_list) 
+        # 内部移動（Qt6 の QListWidget は moveRows で行を動かす）は、移動範囲だけを state 側でも付け替える
+        lst.model().rowsMoved.connect(lambda _p, start, end, _dp, dst, cn=cat_name: self._move_resident_items(cn, start, end, dst))
 
         # ▼ UUIDを QListWidgetItem に埋める（順序安定）
         items_data = self.state["categories"].get(cat_name, {}).get("items", [])
@@ -846,6 +1501,8 @@ class MainWindow(QtWidgets.QMainWindow):
         v.addWidget(lst, 1); v.addLayout(hb)
 
         # 🌟 選択状態の復元（前回選択していたUUIDに基づいて）
+        # notify=False（後から開いたタブ）のときは詳細欄を切り替えない
+        lst.blockSignals(not notify)
         initial_row = -1
         if self._detail_ref_uuid:
             for i in range(lst.count()):
@@ -858,10 +1515,11 @@ class MainWindow(QtWidgets.QMainWindow):
         elif lst.count() > 0:
             lst.setCurrentRow(0)
             # 選択されたら _on_resident_selected が呼ばれるので、ここでは手動で呼ばない
-        else:
+        elif notify:
             # 項目がない場合は詳細をクリア
             if self.residentTabs.tabText(self.residentTabs.currentIndex()) == cat_name:
                  self._on_resident_selected(cat_name, -1) 
+        lst.blockSignals(False)
         
         return wrap
 
@@ -869,10 +1527,11 @@ class MainWindow(QtWidgets.QMainWindow):
         wrap = QtWidgets.QWidget()
         v = QtWidgets.QVBoxLayout(wrap); v.setContentsMargins(8,8,8,8)
 
-        self.residentArchiveList = QtWidgets.QListWidget(objectName="list_resident_archive")
-        self.residentArchiveList.setStyleSheet(f"QListWidget{{background:{PANEL_BG}; border:1px solid {BORDER}; border-radius:8px;}}")
-        self.residentArchiveList.setItemDelegate(SeparatorDelegate(self.residentArchiveList))
-        self.residentArchiveList.itemDoubleClicked.connect(self._edit_resident_archive_item)
+        self.residentArchiveModel = ResidentArchiveModel([])
+        self.residentArchiveList = QtWidgets.QListView(objectName="list_resident_archive"); self.residentArchiveList.setModel(self.residentArchiveModel)
+        self.residentArchiveList.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.residentArchiveList.setItemDelegate(self._sep_delegate)
+        self.residentArchiveList.doubleClicked.connect(self._edit_resident_archive_item)
 
         self._refresh_resident_archive_list()
 
@@ -898,6 +1557,7 @@ class MainWindow(QtWidgets.QMainWindow):
         new_uuid = str(uuid.uuid4())
         item = {"id": new_uuid, "title": title, "html": ""}
         self.state["categories"][cat_name]["items"].append(item)
+        self._mark_dirty()
 
         # ▼ QListWidgetItem にも id を持たせる
         list_item = QtWidgets.QListWidgetItem(title)
@@ -929,6 +1589,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if not new: return
         
         item_data["title"] = new
+        self._mark_dirty()
         list_widget.item(row).setText(new)
         
         # 詳細ラベルの更新もUUIDベースで安全に確認
@@ -966,18 +1627,19 @@ class MainWindow(QtWidgets.QMainWindow):
         item_to_archive["archived_at"] = int(time.time())
         item_to_archive["original_category"] = cat_name
         self.state["categories"][cat_name]["archive"].append(item_to_archive)
+        self._log_archive("add", cat_name, item_to_archive); self._mark_dirty()
         
         # 削除した項目が選択されていた場合は詳細をクリア
         if self._detail_ref and self._detail_ref[0] == "resident" and self._detail_ref[2] == item_id:
             self._load_detail(None)
         
-        self._refresh_resident_archive_list()
+        # 一覧は作り直さず、今アーカイブした（＝最新の）項目を先頭に1行足す
+        self._res_archive_by_id[item_to_archive["id"]] = (cat_name, item_to_archive)
+        self.residentArchiveModel.items.append(item_to_archive); self.residentArchiveModel.add([item_to_archive])
         self._save_last_state()
         
         # アーカイブタブに切り替え
-        for i in range(self.residentTabs.count()):
-            if self.residentTabs.tabText(i) == "アーカイブ":
-                self.residentTabs.setCurrentIndex(i); break
+        self._select_resident_tab("アーカイブ")
 
     def _delete_resident_item(self, cat_name: str, list_widget: ResidentListWidget):
         row = list_widget.currentRow()
@@ -1003,6 +1665,7 @@ class MainWindow(QtWidgets.QMainWindow):
             return
             
         items.pop(item_index)
+        self._mark_dirty()
         list_widget.takeItem(row)
         
         # 削除した項目が選択されていた場合は詳細をクリア
@@ -1012,9 +1675,24 @@ class MainWindow(QtWidgets.QMainWindow):
         self._save_last_state()
 
     # 📌 修正: ドロップ時に呼び出され、データ側の順序をUIに合わせて更新するメソッド
+    def _move_resident_items(self, cat_name: str, start: int, end: int, dst: int):
+        """rowsMoved の引数どおりに、state の項目配列の [start, end] を dst の前へ移す（全体は作り直さない）"""
+        items = self.state["categories"][cat_name]["items"]
+        block = items[start:end + 1]; del items[start:end + 1]
+        at = dst if dst < start else dst - len(block)
+        items[at:at] = block
+        self._resident_rows_moved = True
+        self._mark_dirty()
+
     def _update_resident_items_order_from_list(self, cat_name: str, list_widget: ResidentListWidget, selected_uuid: Optional[str]):
         """リストウィジェットの現在のアイテム順序に基づいて、データ (self.state) の順序を更新する。"""
         # ResidentListWidget の dropEvent で、既に detailEditor の内容は保存済み
+        if self._resident_rows_moved:
+            # rowsMoved で既に state 側も並べ替え済み。選択中の項目だけ合わせ直す
+            self._resident_rows_moved = False; self._save_last_state()
+            if selected_uuid: self._detail_ref_uuid = selected_uuid; self._load_detail(("resident", cat_name, selected_uuid))
+            else: self._load_detail(None)
+            return
         
         items = self.state["categories"][cat_name]["items"]
         # UUIDをキーとするアイテムの辞書を作成
@@ -1031,9 +1709,11 @@ class MainWindow(QtWidgets.QMainWindow):
         
         # UI上のアイテム数とデータ上のアイテム数が一致しているか確認
         if len(new_items) == len(items) and len(new_items) == list_widget.count():
-            # 順序が正しく反映されていれば、データリストを更新
-            self.state["categories"][cat_name]["items"] = new_items
-            self._save_last_state()
+            # 順序が正しく反映されていれば、データリストを更新（同じ位置へのドロップでは何もしない）
+            if any(a is not b for a, b in zip(new_items, items)):
+                items[:] = new_items # リスト自体は差し替えず、その場で並べ替える（参照している側がずれない）
+                self._mark_dirty()
+                self._save_last_state()
             
             # 並び替え後、選択中の項目（UUIDベース）を再ロードする
             if selected_uuid:
@@ -1054,37 +1734,26 @@ class MainWindow(QtWidgets.QMainWindow):
 
     # --- 常駐アーカイブ ---
     def _refresh_resident_archive_list(self):
-        if not hasattr(self, 'residentArchiveList'): return
-        self.residentArchiveList.clear()
-        all_archives = []
-        for cat_data in self.state["categories"].values():
-            for item in cat_data.get("archive", []):
-                all_archives.append(item)
-        sorted_arc = sorted(all_archives, key=lambda x: x.get("archived_at", 0), reverse=True)
-        for it in sorted_arc:
-            ts = QtCore.QDateTime.fromSecsSinceEpoch(it.get("archived_at", 0)).toString("yyyy-MM-dd HH:mm")
-            title = it.get('title','')
-            orig_cat = it.get('original_category', '不明')
-            list_item = QtWidgets.QListWidgetItem(f"[{orig_cat}] {ts} - {title}")
-            # 🌟 IDを埋め込む
-            list_item.setData(QtCore.Qt.UserRole, it["id"])
-            self.residentArchiveList.addItem(list_item)
-
-    def _get_resident_archive_item(self, row: int) -> Optional[Dict[str, Any]]:
-        """行インデックスからUUIDでアーカイブ項目を取得"""
-        if not hasattr(self, 'residentArchiveList') or row < 0: return None
-        item = self.residentArchiveList.item(row)
-        if not item: return None
-        item_id = item.data(QtCore.Qt.UserRole)
-        for cat_data in self.state["categories"].values():
-            for archive_item in cat_data.get("archive", []):
-                if archive_item["id"] == item_id:
-                    return archive_item
-        return None
+        if not hasattr(self, 'residentArchiveModel'): return
+        # UUID -> (格納先カテゴリ, 項目)。削除のたびに全カテゴリを走査しないための索引
+        self._res_archive_by_id = {item["id"]: (cat, item) for cat, cat_data in self.state["categories"].items() for item in cat_data.get("archive", [])}
+        # 並べ替えと表示文字列の用意はモデルが行う（QListWidgetItem は作らない）
+        self.residentArchiveModel.items = [item for _, item in self._res_archive_by_id.values()]
+        self.residentArchiveModel.refresh()
+
+    def _resident_archive_row(self) -> int:
+        idx = self.residentArchiveList.currentIndex()
+        return idx.row() if idx.isValid() else -1
+
+    def _remove_resident_archive_entry(self, archive_item: Dict[str, Any]):
+        """索引から格納先カテゴリを引いて、そのアーカイブ配列からだけ取り除く"""
+        cat, _ = self._res_archive_by_id.pop(archive_item["id"])
+        _remove_identical(self.state["categories"][cat]["archive"], archive_item)
+        self._log_archive("del", cat, archive_item)
 
     def _restore_resident_archive_item(self):
-        row = self.residentArchiveList.currentRow()
-        archive_item = self._get_resident_archive_item(row)
+        row = self._resident_archive_row()
+        archive_item = self.residentArchiveModel.get_item_by_row(row)
         if not archive_item: return
         
         # 🌟 修正: 確実に詳細を保存してから操作
@@ -1097,19 +1766,20 @@ class MainWindow(QtWidgets.QMainWindow):
             return
             
         # 該当アーカイブを削除
-        self.state["categories"][orig_cat]["archive"] = [it for it in self.state["categories"][orig_cat]["archive"] if it["id"] != archive_item["id"]]
+        self._remove_resident_archive_entry(archive_item)
         # 復元アイテムをリストに追加
         restored_item = {k: v for k, v in archive_item.items() if k not in ["archived_at", "original_category"]}
         self.state["categories"][orig_cat]["items"].append(restored_item)
         
-        self._rebuild_resident_tabs(); self._refresh_resident_archive_list(); self._save_last_state()
-        for i in range(self.residentTabs.count()):
-            if self.residentTabs.tabText(i) == orig_cat:
-                self.residentTabs.setCurrentIndex(i); break
+        # アーカイブ一覧からはその1行だけ除き、復元先のタブだけ作り直す
+        self.residentArchiveModel.remove_row(row)
+        self._reload_resident_tab(self._cat_tab_index[orig_cat], orig_cat)
+        self._mark_dirty(); self._save_last_state()
+        self._select_resident_tab(orig_cat)
 
     def _delete_resident_archive_item(self):
-        row = self.residentArchiveList.currentRow()
-        archive_item = self._get_resident_archive_item(row)
+        row = self._resident_archive_row()
+        archive_item = self.residentArchiveModel.get_item_by_row(row)
         if not archive_item: return
         
         # 🌟 修正: 確実に詳細を保存してから操作
@@ -1118,34 +1788,30 @@ class MainWindow(QtWidgets.QMainWindow):
         if QtWidgets.QMessageBox.question(self, "削除確認", f"アーカイブ項目「{archive_item['title']}」を完全に削除しますか？") != QtWidgets.QMessageBox.Yes:
             return
             
-        # UUIDで全てのカテゴリのアーカイブから削除
-        for cat_data in self.state["categories"].values():
-            cat_data["archive"] = [it for it in cat_data.get("archive", []) if it["id"] != archive_item["id"]]
+        # UUIDの索引から格納先を引いて削除し、一覧からもその1行だけ取り除く
+        self._remove_resident_archive_entry(archive_item)
+        self.residentArchiveModel.remove_row(row)
             
-        self._refresh_resident_archive_list(); self._save_last_state()
+        self._save_last_state()
 
-    def _edit_resident_archive_item(self, item: QtWidgets.QListWidgetItem):
-        row = self.residentArchiveList.currentRow()
-        target = self._get_resident_archive_item(row)
+    def _edit_resident_archive_item(self, index: QtCore.QModelIndex):
+        row = index.row()
+        target = self.residentArchiveModel.get_item_by_row(row)
         if not target: return
         
         new_title, ok = QtWidgets.QInputDialog.getText(self, "アーカイブのタイトル", "タイトル：", text=target.get("title",""))
         if not ok: return
         
-        dlg = QtWidgets.QInputDialog(self); dlg.setWindowTitle("アーカイブの本文（プレーンテキスト）")
-        dlg.setLabelText("本文："); dlg.setTextValue(html_to_plain(target.get("html","")))
-        if dlg.exec() == QtWidgets.QDialog.Accepted:
-            body_plain = dlg.textValue(); body_html = plain_to_html(body_plain)
-            
-            # UUIDでアイテムを検索して更新
-            found = False
-            for cat_data in self.state["categories"].values():
-                for it in cat_data.get("archive", []):
-                    if it["id"] == target["id"]:
-                        it["title"] = new_title; it["html"] = body_html; found = True; break
-                if found: break
+        dlg = ArchiveBodyDialog(target.get("html", ""), self)
+        accepted = dlg.exec() == QtWidgets.QDialog.Accepted; body_html = dlg.html() if accepted else None; dlg.deleteLater()
+        if accepted:
+            if body_html is None and new_title == target.get("title", ""): return # 何も変わっていなければ書かない
+            # 項目そのものを更新（並び順は変わらないので、その行の表示だけ直す）
+            target["title"] = new_title
+            if body_html is not None: target["html"] = body_html
+            self.residentArchiveModel.item_changed(row)
                 
-            self._refresh_resident_archive_list(); self._save_last_state()
+            self._log_archive("put", self._res_archive_by_id[target["id"]][0], target); self._save_last_state()
 
     # --- セレクション → 詳細に読み込み ---
     def _on_todo_selected(self, current: QtCore.QModelIndex, previous: QtCore.QModelIndex):
@@ -1159,13 +1825,8 @@ class MainWindow(QtWidgets.QMainWindow):
         # 🌟 _load_detailで保存処理を呼ぶので、ここでは不要
         
         selected_item_uuid = None
-        current_tab_index = -1
-        
         # 適切なカテゴリのタブインデックスを取得
-        for i in range(self.residentTabs.count()):
-            if self.residentTabs.tabText(i) == cat_name:
-                current_tab_index = i
-                break
+        current_tab_index = self._cat_tab_index.get(cat_name, -1)
                 
         if current_tab_index >= 0:
             # 適切なカテゴリのタブウィジェットを取得
@@ -1190,9 +1851,10 @@ class MainWindow(QtWidgets.QMainWindow):
 
     # --- 詳細欄ロード／保存 ---
     def _load_detail(self, ref: Optional[Tuple]):
-        # 🌟 修正: ここで、前の参照先の内容を必ずメモリに保存する
-        if hasattr(self, "_detail_ref") and self._detail_ref != ref:
-            self._apply_detail_to_state()
+        # 🌟 修正: ここで、前の参照先の内容を必ずメモリに保存する（未編集なら _apply_detail_to_state は何もしない）
+        self._apply_detail_to_state()
+        # 同じ項目を選び直しただけなら、エディタの内容がそのまま最新なので読み込み直さない
+        if ref is not None and ref == self._detail_ref: return
             
         self._detail_ref = ref
         
@@ -1201,7 +1863,7 @@ class MainWindow(QtWidgets.QMainWindow):
         
         if ref is None:
             self.detailLabel.setText("詳細")
-            self.detailEditor.clear()
+            self._show_blank_detail()
             self.detailEditor.setPlaceholderText("ToDo または 常駐事項の項目を選択すると、ここで詳細編集できます。")
             
         elif ref[0] == "todo":
@@ -1209,9 +1871,9 @@ class MainWindow(QtWidgets.QMainWindow):
             it = self.todoModel.get_item_by_row(row)
             if it:
                 self.detailLabel.setText(f"詳細（ToDo / {it.get('title','')}）")
-                self.detailEditor.setHtml(it.get("html", ""))
+                self._show_detail_doc(it)
             else:
-                 self.detailEditor.clear()
+                 self._show_blank_detail()
                  self.detailEditor.setPlaceholderText("データが見つかりません")
         
         # 🌟 修正: 常駐事項はUUIDベースでデータを検索・読み込み
@@ -1222,28 +1884,76 @@ class MainWindow(QtWidgets.QMainWindow):
             
             if item_data:
                 self.detailLabel.setText(f"詳細（{cat} / {item_data.get('title','無題')}）")
-                self.detailEditor.setHtml(item_data.get("html",""))
+                self._show_detail_doc(item_data)
             else:
-                self.detailEditor.clear()
+                self._show_blank_detail()
                 self.detailEditor.setPlaceholderText("データが見つかりません")
             
         # UIの更新ブロック解除
         self.detailEditor.blockSignals(False)
+        self._dirty_mask &= ~self._EDIT_DETAIL; self._detail_rev = self.detailEditor.document().revision()
         self._save_last_state()
 
 
+    def _show_blank_detail(self):
+        self._blank_doc.clear(); self.detailEditor.setDocument(self._blank_doc)
+
+    def _show_detail_doc(self, item: Dict[str, Any]):
+        """項目の本文をエディタに出す。最近開いた項目は解析済みの文書を差し替えるだけで、setHtml を省く"""
+        html = item.get("html", ""); key = item["id"]
+        ent = self._detail_docs.get(key)
+        if ent is not None and ent[0] == html: # 別の経路（アーカイブからの復元など）で本文が変わっていれば作り直す
+            self._detail_docs.move_to_end(key); doc = ent[1]
+        else:
+            if ent is not None: ent[1].deleteLater()
+            doc = QtGui.QTextDocument(self.detailEditor); doc.setDefaultFont(self.detailEditor.font())
+            doc.setHtml(html)
+            self._detail_docs[key] = (html, doc)
+            if len(self._detail_docs) > self._DETAIL_DOCS_MAX:
+                _, (_, old) = self._detail_docs.popitem(last=False); old.deleteLater()
+        self.detailEditor.setDocument(doc)
+
+    def _remember_detail_html(self, item: Dict[str, Any]):
+        """書き戻した本文を文書キャッシュにも記録する（次に開いたとき、同じ内容なら文書を使い回せる）"""
+        ent = self._detail_docs.get(item.get("id"))
+        if ent is not None: self._detail_docs[item["id"]] = (item["html"], ent[1])
+
+    @staticmethod
+    def _debounce(timer: QtCore.QTimer):
+        """入力のたびにタイマーを張り直すが、50ms 以内に張り直したばかりなら省く（満了が最大 50ms 早まるだけ）"""
+        if timer.remainingTime() < timer.interval() - 50: timer.start()
+
+    def _on_editor_changed(self, bit: int):
+        self._dirty_mask |= bit; self._debounce(self._editTimer)
+
+    def _on_free_changed(self):
+        self._dirty_mask |= self._EDIT_FREE; self._debounce(self.saveTimer)
+
+    def _flush_editors(self):
+        """共有タイマー満了時に、編集されたエディタだけをまとめてメモリへ反映する"""
+        if self._dirty_mask & self._EDIT_DETAIL: self._apply_detail_to_state()
+        if self._dirty_mask & self._EDIT_FREE: self._apply_free_to_state()
+
     def _apply_detail_to_state(self):
         """詳細エディタの内容を、参照元のデータ構造（メモリ）に書き戻す（ディスクには保存しない）"""
         if not hasattr(self, "_detail_ref") or not self._detail_ref: return
+        if not self._dirty_mask & self._EDIT_DETAIL: return # ロード後に編集されていなければ書き戻す必要はない
+        self._dirty_mask &= ~self._EDIT_DETAIL
+        # 文書のリビジョンが前回反映時と同じなら toHtml()（文書全体のシリアライズ）を省く
+        rev = self.detailEditor.document().revision()
+        if rev == self._detail_rev: return
+        self._detail_rev = rev
         
         # HTMLをインライン化して取得
-        html = inline_external_images(self.detailEditor.toHtml())
+        html = self._intern_html(inline_external_images_cached(self.detailEditor.toHtml()))
         
         if self._detail_ref[0] == "todo":
             row = self._detail_ref[1]
             if 0 <= row < len(self.state["todo"]["items"]):
-                self.state["todo"]["items"][row]["html"] = html
-                self.todoModel.dataChanged.emit(self.todoModel.index(row), self.todoModel.index(row))
+                it = self.state["todo"]["items"][row]
+                if it.get("html") is html: return # 内容に変化なし
+                it["html"] = html; self._remember_detail_html(it)
+                self._mark_dirty() # 本文は一覧に表示しないので dataChanged は出さない（行の再描画を起こさない）
         
         # 🌟 修正: 常駐事項はUUIDベースでデータを検索・保存
         elif self._detail_ref[0] == "resident":
@@ -1253,7 +1963,7 @@ class MainWindow(QtWidgets.QMainWindow):
             
             for item in items:
                 if item.get("id") == item_id:
-                    item["html"] = html
+                    if item.get("html") is not html: item["html"] = html; self._remember_detail_html(item); self._mark_dirty()
                     break
                     
         # 🌟 修正: ここで self._save_all() は呼ばない。ディスク保存は saveTimer の役割。
@@ -1282,25 +1992,18 @@ class MainWindow(QtWidgets.QMainWindow):
                 if name != "アーカイブ":
                     new_order.append(name)
             self.state["category_order"] = new_order
+            self._mark_dirty()
             self._save_last_state()
-
-            # ★再構築でラベルと中身のズレを常に解消
-            current_name = tb.tabText(self.residentTabs.currentIndex()) if self.residentTabs.count() else None
-            self._rebuild_resident_tabs()
-            if current_name:
-                for i in range(self.residentTabs.count()):
-                    if self.residentTabs.tabText(i) == current_name:
-                        self.residentTabs.setCurrentIndex(i)
-                        break
+            # タブの中身はラベルと一緒に動くので、作り直さずに索引だけ更新する
+            self._reindex_resident_tabs()
         finally:
             self._tab_move_in_progress = False
 
 
     def closeEvent(self, e: QtGui.QCloseEvent):
         """アプリ終了時に現在の状態を保存"""
-        self._apply_detail_to_state() # 最後にメモリに反映
-        self._save_all() # 最後にディスクに保存
-        self._save_last_state()
+        self._last_state_pending = True; self._write_last_state() # window.json も _save_now でまとめて書く
+        self._save_now() # 最後にメモリへ反映してディスクに保存
         super().closeEvent(e)
 
 
@@ -1315,14 +2018,14 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.warning(self, "重複", "同名のカテゴリが既にあります。"); return
             
         self.state["categories"][name] = {"items": [], "archive": []}
-        # タブ順序のリストを更新する（再構築時に反映される）
         self.state["category_order"].append(name) 
-        self._rebuild_resident_tabs()
+        self._mark_dirty()
+        # 他のタブは作り直さず、アーカイブタブの前に1枚だけ差し込む
+        self.residentTabs.insertTab(self._cat_tab_index["アーカイブ"], self._lazy_category_tab(name), name)
+        self._reindex_resident_tabs()
         
         # 新しいタブに切り替える（アーカイブタブの前の位置）
-        for i in range(self.residentTabs.count()):
-            if self.residentTabs.tabText(i) == name:
-                self.residentTabs.setCurrentIndex(i); break
+        self._select_resident_tab(name)
         self._save_last_state()
 
     def _rename_resident_tab(self):
@@ -1344,16 +2047,19 @@ class MainWindow(QtWidgets.QMainWindow):
         
         self.state["categories"][new] = self.state["categories"].pop(old)
         self.state["category_order"] = [new if x == old else x for x in self.state["category_order"]]
+        self._mark_dirty()
         # アーカイブ項目内の元カテゴリ名も更新
         for arc in self.state["categories"][new]["archive"]:
             if arc.get("original_category") == old:
                 arc["original_category"] = new
+        self._mark_archive_dirty() # 格納先の名前が変わるので、追記ではなく丸ごと書き直す
                 
-        self._rebuild_resident_tabs()
-        # 選択状態を復元
-        for i in range(self.residentTabs.count()):
-            if self.residentTabs.tabText(i) == new:
-                self.residentTabs.setCurrentIndex(i); break
+        # 項目ボタンなどがカテゴリ名を持っているので、このタブだけ作り直す
+        self._reload_resident_tab(cur, new)
+        # アーカイブ一覧は並び順はそのままで、索引の格納先と表示名だけ変える
+        for iid, (cat, item) in self._res_archive_by_id.items():
+            if cat == old: self._res_archive_by_id[iid] = (new, item)
+        self.residentArchiveModel.relabel()
         self._save_last_state()
 
     def _delete_resident_tab(self):
@@ -1369,9 +2075,17 @@ class MainWindow(QtWidgets.QMainWindow):
         # 🌟 修正: 詳細エディタの内容を保存してから操作
         self._apply_detail_to_state()
         
-        self.state["categories"].pop(name, None)
+        removed = self.state["categories"].pop(name, None)
         self.state["category_order"] = [x for x in self.state["category_order"] if x != name]
-        self._rebuild_resident_tabs()
+        self._mark_dirty()
+        w = self.residentTabs.widget(cur); self.residentTabs.removeTab(cur); w.deleteLater()
+        self._reindex_resident_tabs()
+        if removed and removed.get("archive"):
+            # 同名カテゴリを作り直したときに古いアーカイブが復活しないよう、ログから消す
+            self._mark_archive_dirty()
+            # 一覧は作り直さず、消えたカテゴリの行だけを取り除く（残りの並び順はそのまま）
+            self._res_archive_by_id = {iid: v for iid, v in self._res_archive_by_id.items() if v[0] != name}
+            self.residentArchiveModel.remove_items(removed["archive"])
         
         # 削除されたカテゴリの項目が選択されていた場合、詳細をクリア
         if self._detail_ref and self._detail_ref[0] == "resident" and self._detail_ref[1] == name:
@@ -1381,30 +2095,10 @@ class MainWindow(QtWidgets.QMainWindow):
 
     # ----- Global style -----
     def _apply_global_style(self):
-        self.setStyleSheet(f"""
-            QWidget {{ background: {BG}; color: {FG}; }}
-            QLineEdit, QListView, QTabWidget::pane, QMenu {{
-                background: {PANEL_BG}; border: 1px solid {BORDER}; border-radius: 8px;
-            }}
-            QListView::item:selected {{ background: {ACCENT_WEAK}; color: {FG}; }}
-            QLineEdit {{ padding:6px 8px; }}
-            QPushButton {{
-                background: {PANEL_BG}; border:1px solid {BORDER}; border-radius:8px; padding:6px 10px;
-            }}
-            QPushButton:hover {{ border-color: {ACCENT_HOVER}; }}
-            QPushButton:pressed {{ background: #f2f6ff; border-color:{ACCENT}; }}
-            QTabBar::tab {{
-                background: {PANEL_BG}; border:1px solid {BORDER}; border-bottom: none; padding:6px 12px; margin-right:2px;
-                border-top-left-radius:8px; border-top-right-radius:8px;
-            }}
-            QTabBar::tab:selected {{ background: {ACCENT_WEAK}; border-color:{ACCENT}; }}
-            QTabWidget::pane {{ border-top: 1px solid {ACCENT}; border-radius:8px; }}
-            QScrollBar:vertical {{ background: transparent; width: 10px; margin: 2px 0; }}
-            QScrollBar::handle:vertical {{ background: {BORDER}; border-radius: 6px; }}
-            QScrollBar::handle:vertical:hover {{ background: {ACCENT_HOVER}; }}
-            QScrollBar:horizontal {{ background: transparent; height: 10px; margin: 0 2px; }}
-            QScrollBar::handle:horizontal {{ background: {BORDER}; border-radius: 6px; }}
-        """)
+        """ウィンドウ全体のスタイルシートを1回だけ適用する。
+        個々のウィジェットに setStyleSheet すると子孫ごとにスタイルの再計算が走るので、
+        ツールバー・スプリッタ・ラベル・エディタの指定も objectName のセレクタでここにまとめる"""
+        self.setStyleSheet(_GLOBAL_QSS)
 
     # ----- Event / Window flags -----
     def eventFilter(self, obj, ev):
@@ -1416,10 +2110,9 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def _toggle_size_70(self):
         if self.isMaximized(): self.showNormal()
-        avail = QtGui.QGuiApplication.primaryScreen().availableGeometry()
+        avail, target_w, target_h, tol_w, tol_h = self._avail()
         cur = self.geometry()
-        target_w, target_h = int(avail.width()*0.7), int(avail.height()*0.7)
-        near_70 = abs(cur.width()-target_w) <= int(avail.width()*0.02) and abs(cur.height()-target_h) <= int(avail.height()*0.02)
+        near_70 = abs(cur.width()-target_w) <= tol_w and abs(cur.height()-target_h) <= tol_h
         if near_70 and hasattr(self, "prev_geometry") and self.prev_geometry:
             self.setGeometry(self.prev_geometry); self.prev_geometry = None
         else:
@@ -1435,8 +2128,7 @@ class MainWindow(QtWidgets.QMainWindow):
         menu = QtWidgets.QMenu()
         act_show = menu.addAction("表示／前面へ"); act_hide = menu.addAction("最小化")
         menu.addSeparator()
-        self.actTrayOnTop = menu.addAction("常に手前に表示"); self.actTrayOnTop.setCheckable(True); self.actTrayOnTop.setChecked(False)
-        self.actTrayOnTop.toggled.connect(self._toggle_always_on_top)
+        menu.addAction(self.actOnTop) # ツールバーと同じ QAction を共有するので、チェック状態の同期は不要
         menu.addSeparator()
         act_quit = menu.addAction("終了")
         act_show.triggered.connect(self._bring_front); act_hide.triggered.connect(self.showMinimized); act_quit.triggered.connect(QtWidgets.QApplication.quit)
@@ -1444,30 +2136,45 @@ class MainWindow(QtWidgets.QMainWindow):
 
     # ----- Always on Top -----
     def _toggle_always_on_top(self, on: bool):
-        if hasattr(self, "actOnTop") and self.actOnTop.isChecked() != on:
-            self.actOnTop.blockSignals(True); self.actOnTop.setChecked(on); self.actOnTop.blockSignals(False)
-        if hasattr(self, "actTrayOnTop") and self.actTrayOnTop.isChecked() != on:
-            self.actTrayOnTop.blockSignals(True); self.actTrayOnTop.setChecked(on); self.actTrayOnTop.blockSignals(False)
         self._apply_on_top(bool(on))
 
     def _apply_on_top(self, on: bool, first_time: bool = False):
-        self.setWindowFlag(QtCore.Qt.WindowStaysOnTopHint, on)
-        self._force_standard_window_buttons()
+        # 状態が変わらないなら何もしない（フラグ変更はネイティブウィンドウの作り直しでちらつく）
+        if on == self._on_top_state and not first_time: return
+        self._on_top_state = on
+        self._force_standard_window_buttons(on)
         if self.isMinimized(): self.showNormal()
         else: self.show()
         self.raise_(); self.activateWindow()
         if first_time and hasattr(self, "actOnTop"):
             self.actOnTop.blockSignals(True); self.actOnTop.setChecked(False); self.actOnTop.blockSignals(False)
 
-    def _force_standard_window_buttons(self):
-        self.setWindowFlag(QtCore.Qt.Window, True)
-        self.setWindowFlag(QtCore.Qt.WindowCloseButtonHint, True)
-        self.setWindowFlag(QtCore.Qt.WindowMinMaxButtonsHint, True)
+    _STD_WINDOW_FLAGS = QtCore.Qt.Window | QtCore.Qt.WindowCloseButtonHint | QtCore.Qt.WindowMinMaxButtonsHint
+
+    def _force_standard_window_buttons(self, on_top: bool):
+        """標準ボタンと OnTop をまとめた1つのマスクにし、変化があるときだけ1回で設定する"""
+        flags = self.windowFlags() | self._STD_WINDOW_FLAGS
+        flags = flags | QtCore.Qt.WindowStaysOnTopHint if on_top else flags & ~QtCore.Qt.WindowStaysOnTopHint
+        if flags != self.windowFlags(): self.setWindowFlags(flags)
 
     # ----- Geometry -----
+    def _avail(self) -> Tuple[QtCore.QRect, int, int, int, int]:
+        """主画面の作業領域と、70% サイズ・許容誤差（2%）を返す（画面構成が変わるまで使い回す）"""
+        if self._avail_cache is None:
+            a = QtGui.QGuiApplication.primaryScreen().availableGeometry()
+            self._avail_cache = (a, int(a.width()*0.7), int(a.height()*0.7), int(a.width()*0.02), int(a.height()*0.02))
+        return self._avail_cache
+
+    def _invalidate_avail(self, *_):
+        self._avail_cache = None
+
+    def _on_primary_screen_changed(self, screen: QtGui.QScreen):
+        self._invalidate_avail()
+        if screen: screen.availableGeometryChanged.connect(self._invalidate_avail, QtCore.Qt.UniqueConnection)
+
     def _restore_geometry(self):
         geo = self.conf.get("geometry")
-        avail = QtGui.QGuiApplication.primaryScreen().availableGeometry()
+        avail = self._avail()[0]
         if geo:
             rect = QtCore.QRect(*geo)
             if rect.width() > int(avail.width()*0.98) or rect.height() > int(avail.height()*0.98):
@@ -1478,7 +2185,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self._apply_percent_size(0.7)
 
     def _apply_percent_size(self, ratio: float):
-        avail = QtGui.QGuiApplication.primaryScreen().availableGeometry()
+        avail = self._avail()[0]
         w, h = int(avail.width()*ratio), int(avail.height()*ratio)
         x = avail.left() + (avail.width()-w)//2
         y = avail.top()  + (avail.height()-h)//3
@@ -1487,9 +2194,17 @@ class MainWindow(QtWidgets.QMainWindow):
     def moveEvent(self, e): self._save_window_conf()
     def resizeEvent(self, e): self._save_window_conf()
     def _save_window_conf(self):
-        g = self.geometry()
-        self.conf["geometry"] = [g.x(), g.y(), g.width(), g.height()]
-        save_json(CONF_FILE, self.conf)
+        """移動・リサイズ中は何度も呼ばれるので、印を付けるだけ。geometry の読み取りと書き込みは _confTimer で最後の1回にまとめる"""
+        self._geom_dirty = True; self._confTimer.start()
+
+    def _flush_window_conf(self):
+        self._confTimer.stop()
+        if not self._geom_dirty: return
+        self._geom_dirty = False
+        g = self.geometry(); geo = [g.x(), g.y(), g.width(), g.height()]
+        if geo == self.conf.get("geometry"): return # 元の位置・大きさに戻っただけなら書かない
+        self.conf["geometry"] = geo
+        self._mark_conf_dirty()
 
     # ----- ToDo -----
     def _add_todo(self):
@@ -1537,9 +2252,8 @@ class MainWindow(QtWidgets.QMainWindow):
         new = new.strip()
         if not new: return
         
-        # 実体を書き換え & モデルへ通知
-        item_data["title"] = new
-        self.todoModel.dataChanged.emit(self.todoModel.index(row), self.todoModel.index(row))
+        # モデル経由で書き換え（dataChanged で _mark_dirty も走る）
+        self.todoModel.set_title(row, new)
         
         # 詳細ラベルの更新
         if self._detail_ref and self._detail_ref[0] == "todo" and self._detail_ref[1] == row:
@@ -1564,42 +2278,32 @@ class MainWindow(QtWidgets.QMainWindow):
         if not picked: return
         col = picked.data()
         
-        item_data = self.todoModel.get_item_by_row(row)
-        if not item_data: return
-        
-        item_data["color"] = col
-        self.todoModel.dataChanged.emit(self.todoModel.index(row), self.todoModel.index(row))
+        if not self.todoModel.get_item_by_row(row): return
+        self.todoModel.set_color(row, col)
         self._save_last_state()
 
     # ----- ToDo Archive -----
-    def _get_todo_archive_item_by_list_row(self, row: int) -> Optional[Dict[str, Any]]:
-        """リストウィジェットの行からUUIDを介してアーカイブ項目を取得（ToDo用）"""
-        if row < 0 or row >= self.archiveList.count(): return None
-        item_w = self.archiveList.item(row)
-        item_id = item_w.data(QtCore.Qt.UserRole)
-        
-        for it in self.state["todo"]["archive"]:
-            if it.get("id") == item_id:
-                return it
-        return None
+    def _todo_archive_row(self) -> int:
+        idx = self.archiveList.currentIndex()
+        return idx.row() if idx.isValid() else -1
 
-    def _edit_archive_item(self, item: QtWidgets.QListWidgetItem):
-        row = self.archiveList.row(item)
-        target = self._get_todo_archive_item_by_list_row(row)
+    def _edit_archive_item(self, index: QtCore.QModelIndex):
+        row = index.row()
+        target = self.archiveModel.get_item_by_row(row)
         if not target: return
 
         new_title, ok = QtWidgets.QInputDialog.getText(self, "アーカイブのタイトル", "タイトル：", text=target.get("title",""))
         if not ok: return
         
-        dlg = QtWidgets.QInputDialog(self); dlg.setWindowTitle("アーカイブの本文（プレーンテキスト）")
-        dlg.setLabelText("本文："); dlg.setTextValue(html_to_plain(target.get("html","")))
-        if dlg.exec() == QtWidgets.QDialog.Accepted:
-            body_plain = dlg.textValue(); body_html = plain_to_html(body_plain)
-            
+        dlg = ArchiveBodyDialog(target.get("html", ""), self)
+        accepted = dlg.exec() == QtWidgets.QDialog.Accepted; body_html = dlg.html() if accepted else None; dlg.deleteLater()
+        if accepted:
+            if body_html is None and new_title == target.get("title", ""): return # 何も変わっていなければ書かない
             # 🌟 UUIDベースでデータを更新
-            target["title"] = new_title; target["html"] = body_html
+            target["title"] = new_title
+            if body_html is not None: target["html"] = body_html
             
-            self._refresh_todo_archive_list(); self._save_last_state()
+            self._log_archive("put", None, target); self.archiveModel.item_changed(row); self._save_last_state()
 
     def _archive_done(self):
         # 🌟 修正: 操作前に詳細を保存
@@ -1610,51 +2314,40 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.information(self, "情報", "完了済みのToDoがありません。"); return
             
         now = int(time.time())
-        for it in done:
-            # 既存のIDをそのまま引き継ぐ
-            self.state["todo"]["archive"].append({
-                "id": it.get("id", str(uuid.uuid4())), "title": it.get("title",""), "archived_at": now,
-                "html": it.get("html", ""), "color": it.get("color"),
-            })
+        # 既存のIDをそのまま引き継ぐ
+        new_arc = [{
+            "id": it.get("id", str(uuid.uuid4())), "title": it.get("title",""), "archived_at": now,
+            "html": it.get("html", ""), "color": it.get("color"),
+        } for it in done]
+        self.state["todo"]["archive"].extend(new_arc)
+        for it in new_arc: self._log_archive("add", None, it)
             
-        self.state["todo"]["items"] = [it for it in self.state["todo"]["items"] if not it.get("done")]
-        self.todoModel.layoutChanged.emit()
+        # 🌟 修正: リストを差し替えるとモデルが古いリストを参照し続けるので、モデル経由でその場から削除する
+        self.todoModel.remove_rows([r for r, it in enumerate(self.todoModel.items) if it.get("done")])
         self._load_detail(None) # 選択解除
         
-        self._refresh_todo_archive_list()
+        self.archiveModel.add(new_arc)
         self.centerTabs.setCurrentIndex(1)
         self._save_last_state()
 
     def _delete_selected_todo_archive(self):
-        row = self.archiveList.currentRow()
-        target = self._get_todo_archive_item_by_list_row(row)
+        row = self._todo_archive_row()
+        target = self.archiveModel.get_item_by_row(row)
         if not target: return
 
         if QtWidgets.QMessageBox.question(self, "削除確認", f"アーカイブ項目「{target['title']}」を削除しますか？") != QtWidgets.QMessageBox.Yes:
             return
             
-        # 🌟 UUIDベースで削除
-        self.state["todo"]["archive"] = [it for it in self.state["todo"]["archive"] if it["id"] != target["id"]]
+        # 🌟 state のリストからその場で削除（モデルが同じリストを参照しているため）
+        self.archiveModel.remove_row(row)
         
-        self._refresh_todo_archive_list(); self._save_last_state()
-
-    def _refresh_todo_archive_list(self):
-        self.archiveList.clear()
-        sorted_arc = sorted(self.state["todo"]["archive"], key=lambda x: x.get("archived_at", 0), reverse=True)
-        for it in sorted_arc:
-            ts = QtCore.QDateTime.fromSecsSinceEpoch(it.get("archived_at", 0)).toString("yyyy-MM-dd HH:mm")
-            item = QtWidgets.QListWidgetItem(f"{ts}  -  {it.get('title','')}")
-            col = it.get("color")
-            if col: item.setBackground(QtGui.QBrush(QtGui.QColor(col)))
-            # 🌟 UUIDを埋め込む
-            item.setData(QtCore.Qt.UserRole, it.get("id"))
-            self.archiveList.addItem(item)
+        self._log_archive("del", None, target); self._save_last_state()
 
     def _show_archive_context_menu(self, pos: QtCore.QPoint):
-        row = self.archiveList.currentRow()
+        row = self._todo_archive_row()
         if row < 0: return
         
-        target = self._get_todo_archive_item_by_list_row(row)
+        target = self.archiveModel.get_item_by_row(row)
         if not target: return
         
         menu = QtWidgets.QMenu(self)
@@ -1675,12 +2368,21 @@ class MainWindow(QtWidgets.QMainWindow):
         # 🌟 UUIDベースで更新
         target["color"] = picked.data()
         
-        self._refresh_todo_archive_list(); self._save_last_state()
+        self._log_archive("put", None, target); self.archiveModel.item_changed(row); self._save_last_state()
 
     # ----- フリースペース -----
-    def _on_free_html_changed(self):
+    def _apply_free_to_state(self):
         """フリースペースの変更をメモリに反映する（ディスク保存は saveTimer が担当）"""
-        self.state["memo2"]["html"] = inline_external_images(self.memoFree.toHtml())
+        if not self._dirty_mask & self._EDIT_FREE: return
+        self._dirty_mask &= ~self._EDIT_FREE
+        rev = self.memoFree.document().revision()
+        if rev == self._free_rev: return
+        self._free_rev = rev
+        html = inline_external_images_cached(self.memoFree.toHtml())
+        # 書式を付けて戻しただけなどで HTML が同じなら、保存（ワーカーでのハッシュ計算も含めて）を起こさない
+        if html == self.state["memo2"]["html"]: return
+        self.state["memo2"]["html"] = html
+        self._mark_memo2_dirty()
         # 🌟 修正: ここで self._save_all() は呼ばない
 
     # ----- 共通 -----
@@ -1688,9 +2390,17 @@ class MainWindow(QtWidgets.QMainWindow):
         bg = self.conf.get("editor_bg", {})
         bg[key] = col.name()
         self.conf["editor_bg"] = bg
-        save_json(CONF_FILE, self.conf)
+        self._mark_conf_dirty()
 
     def _save_last_state(self):
+        """1回の操作の中で何度も呼ばれるので、イベントループに戻ったときに1回だけ書き込む"""
+        if self._last_state_pending: return
+        self._last_state_pending = True
+        QtCore.QTimer.singleShot(0, self._write_last_state)
+
+    def _write_last_state(self):
+        if not self._last_state_pending: return # closeEvent などで既に書き込み済み
+        self._last_state_pending = False
         last = self.conf.get("last", {})
         
         # どの中心タブ（ToDo/アーカイブ）か
@@ -1743,7 +2453,7 @@ class MainWindow(QtWidgets.QMainWindow):
             pass
 
         self.conf["last"] = last
-        save_json(CONF_FILE, self.conf)
+        self._mark_conf_dirty()
 
 
     def _restore_last_state(self):
@@ -1763,11 +2473,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # 常駐タブ復元 (rebuild_resident_tabs内で処理済みだが、念のため)
         rt_name = last.get("resident_tab")
-        if rt_name:
-            for i in range(self.residentTabs.count()):
-                if self.residentTabs.tabText(i) == rt_name:
-                    self.residentTabs.setCurrentIndex(i)
-                    break
+        if rt_name: self._select_resident_tab(rt_name)
 
         # ★ 最後に開いていた詳細をロード (UI側の選択をトリガー)
         kind = last.get("detail_kind")
@@ -1784,10 +2490,7 @@ class MainWindow(QtWidgets.QMainWindow):
             uuid = data.get("uuid")
             if cat and uuid and cat in self.state["categories"]:
                 # 該当カテゴリにタブを切り替え
-                for i in range(self.residentTabs.count()):
-                    if self.residentTabs.tabText(i) == cat:
-                        self.residentTabs.setCurrentIndex(i)
-                        break
+                self._select_resident_tab(cat)
                 
                 # 該当項目を選択
                 cat_widget = self.residentTabs.widget(self.residentTabs.currentIndex())
@@ -1822,9 +2525,107 @@ class MainWindow(QtWidgets.QMainWindow):
     def _bring_front(self):
         self.showNormal(); self.raise_(); self.activateWindow()
 
+    def _mark_dirty(self, *_):
+        """self.state を変更したことを記録する（実際の書き込みは saveTimer が行う）
+        モデルのシグナルから1行ごとに呼ばれることもあるので、タイマーの張り直しは _debounce で間引く"""
+        self._dirty.add("notes"); self._debounce(self.saveTimer)
+
+    def _mark_memo2_dirty(self):
+        self._dirty.add("memo2"); self._debounce(self.saveTimer)
+
+    def _mark_conf_dirty(self):
+        """self.conf を変更したことを記録する（UIスレッドでは書き込まず、notes.json と同じワーカーで書く）"""
+        self._dirty.add("conf"); self._debounce(self.saveTimer)
+
+    def _log_archive(self, op: str, lst: Optional[str], item: Dict[str, Any]):
+        """アーカイブ1件分の変更を追記ログに積む（書き込みは saveTimer が行う）"""
+        self._archive_log.append((op, (lst, item["id"]), archive_record(op, lst, item))); self._debounce(self.saveTimer)
+
+    def _mark_archive_dirty(self):
+        """ログでは表しにくい変更（カテゴリ名の変更・削除）のあとは archive.ndjson を丸ごと書き直す"""
+        self._dirty.add("archive"); self._debounce(self.saveTimer)
+
+    def _notes_snapshot(self) -> Dict[str, Any]:
+        """notes.json に書く部分（memo2 とアーカイブは別ファイル）"""
+        snap = {k: v for k, v in self.state.items() if k != "memo2"}
+        if self._archive_split:
+            snap["todo"] = {k: v for k, v in snap["todo"].items() if k != "archive"}
+            snap["categories"] = {n: {k: v for k, v in c.items() if k != "archive"} for n, c in snap["categories"].items()}
+        return snap
+
+    def _flush_pending_saves(self):
+        """終了直前に、遅延中の保存をすぐに実行する（window.json の変更も _dirty に載るので、先にまとめる）"""
+        if self._confTimer.isActive(): self._flush_window_conf()
+        if self._last_state_pending: self._write_last_state()
+        if self.saveTimer.isActive() or self._dirty or self._dirty_mask or self._archive_log or self._archive_appended: self._save_now()
+
     def _save_all(self):
-        """メモリ上のデータをディスクに書き込む（タイマーでのみ実行）"""
-        save_json(DATA_FILE, self.state)
+        """メモリ上のデータをディスクに書き込む（タイマーでのみ実行）
+        UIスレッドではスナップショットを取るだけで、JSON化と書き込みはワーカースレッドで行う"""
+        if self._dirty_mask & self._EDIT_FREE: self._apply_free_to_state() # フリースペースの HTML 化はここで1回だけ
+        if not self._dirty and not self._archive_log: return # 前回保存から何も変わっていない
+        if self._save_running:
+            self._save_pending = True; return
+        self._save_running = True; dirty, self._dirty = self._dirty, set()
+        entries, self._archive_log = self._archive_log, []
+        self._save_inflight = (dirty, entries) # 書けなかったときに積み直す分
+        pre, post = split_archive_log(entries)
+        # 変更のあったファイルの分だけスナップショットを取る（文字列は共有されるので、コピーされるのは dict/list の骨組みだけ）
+        snap = clone_json(self._notes_snapshot()) if "notes" in dirty else None
+        memo = self.state["memo2"]["html"] if "memo2" in dirty else None
+        conf = clone_json(self.conf) if "conf" in dirty else None
+        # 丸ごと書き直すなら、積んであったログの分もその中に含まれている
+        arc = clone_json(self._archive_lists()) if "archive" in dirty else None
+        if arc is not None: post = ""
+        elif pre or post: self._archive_appended = True
+        QtCore.QThreadPool.globalInstance().start(lambda: self._write_snapshot(snap, memo, arc, pre, post, conf))
+
+    def _write_snapshot(self, snap: Optional[Dict[str, Any]], memo: Optional[str],
+                        arc: Optional[Dict[Optional[str], List[Dict[str, Any]]]] = None, pre: str = "", post: str = "",
+                        conf: Optional[Dict[str, Any]] = None):
+        """（ワーカースレッド）スナップショットを保存し、完了を通知する
+        アーカイブへ移した項目は notes.json より先に、notes.json へ戻した項目の削除は後に書く。
+        途中で落ちても（書き込みに失敗しても）項目は ToDo とアーカイブの両方に残るだけで、どちらからも消えない"""
+        ok = False
+        try:
+            if pre: append_text(ARCHIVE_FILE, pre) # アーカイブは唯一の控えなので同期する
+            if snap is not None: save_json(DATA_FILE, snap, durable=False)
+            if arc is not None: write_bytes_atomic(ARCHIVE_FILE, archive_compact(arc), durable=True)
+            elif post: append_text(ARCHIVE_FILE, post)
+            if memo is not None: save_bytes(MEMO2_FILE, memo.encode("utf-8"), durable=False)
+            if conf is not None: save_json(CONF_FILE, conf, durable=False)
+            ok = True
+        finally:
+            self._saveFinished.emit(ok)
+
+    def _on_save_finished(self, ok: bool):
+        self._save_running = False
+        dirty, entries = self._save_inflight; self._save_inflight = (set(), [])
+        if not ok:
+            # 書けなかった分を積み直す（同じ行を二度追記しても再生結果は変わらない）
+            self._dirty |= dirty; self._archive_log[:0] = entries
+        if self._save_pending:
+            self._save_pending = False
+            self._save_all()
+
+    def _save_now(self):
+        """明示保存／終了時の保存。編集中の詳細・フリースペースも反映し、fsync してから置換する
+        （ディスク上と同じ内容のファイルは書き直さず、自動保存で書いたまま同期していなければ fsync だけ行う）"""
+        self._editTimer.stop(); self._apply_detail_to_state(); self._apply_free_to_state(); self.saveTimer.stop()
+        # 実行中のバックグラウンド保存と .tmp を取り合わないよう、完了を待ってから同期保存する
+        QtCore.QThreadPool.globalInstance().waitForDone()
+        compact = bool(self._archive_log) or self._archive_appended or "archive" in self._dirty
+        # アーカイブへ移した分を追記してから notes.json を書き、そのあとで詰め直す（_write_snapshot と同じ順序）
+        pre = split_archive_log(self._archive_log)[0]
+        if pre: append_text(ARCHIVE_FILE, pre)
+        self._dirty.clear(); self._archive_log.clear()
+        save_json(DATA_FILE, self._notes_snapshot(), durable=True)
+        if compact:
+            # 追記でふくらんだログを、今の内容だけの形に詰め直す
+            write_bytes_atomic(ARCHIVE_FILE, archive_compact(self._archive_lists()), durable=True)
+            self._archive_appended = False
+        save_bytes(MEMO2_FILE, self.state["memo2"]["html"].encode("utf-8"), durable=True)
+        save_json(CONF_FILE, self.conf, durable=True)
 
 # ---------- Entry ----------
 def main():
@@ -1832,6 +2633,8 @@ def main():
     # Windows/Linuxでトレイアイコンが機能するようにQApplicationインスタンスを先に作成
     app = QtWidgets.QApplication(sys.argv) 
     app.setApplicationName(APP_TITLE)
+    QtGui.QPixmapCache.setCacheLimit(20480) # KB（アイコン類のキャッシュ用）
+    app.aboutToQuit.connect(_clear_icon_caches) # QIcon は QApplication より先に解放する
     w = MainWindow()
     # 🌟 Macの場合の挙動調整: Macでは通常トレイアイコンは使わず、ウィンドウを閉じても非表示にする挙動が一般的
     if sys.platform == 'darwin':